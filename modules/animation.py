@@ -1,3 +1,4 @@
+from modules import settings
 from modules import events
 
 import pygame
@@ -13,6 +14,7 @@ class ChunkChangeAnimation:
     def __init__(self) -> None:
         self.enter_pos = (0, 0)
         self.progress = -1
+        self.end_progress = 0
 
     def update_rect(self, x: int, y: int, rect: pygame.Rect) -> pygame.Rect:
         """Move block's rect by it's progress distance."""
@@ -29,6 +31,10 @@ class ChunkChangeAnimation:
         r = r.move(0, new_y)
         return r
 
+    def is_running(self) -> bool:
+        """Check if any block is still moved by the animation."""
+        return self.progress != -1 and self.progress < self.end_progress
+
     def tick(self) -> None:
         self.progress += 10
 
@@ -42,4 +48,11 @@ class ChunkChangeAnimation:
         events.anim_loop.clear()
         self.progress = 0
         self.enter_pos = (enter_position.x, enter_position.y)
+
+        last = settings.CHUNK_SIZE - 1
+        max_distance = max(
+            round(math.dist(self.enter_pos, corner))
+            for corner in ((0, 0), (0, last), (last, 0), (last, last))
+        )
+        self.end_progress = INIT_OFFSET + max_distance * 10
         self.tick()
@@ -0,0 +1,53 @@
+"""
+Block types registry: names, block IDs and texture variants. Doesn't depend
+on pygame, so it can be used by generation worker processes.
+"""
+
+import random
+
+
+EMPTY_ID = 0
+"""Block ID reserved for an empty cell."""
+
+WATER_SHORES = ["full", "e", "n", "ne", "nsew", "nw", "s", "se", "sw", "w"]
+WATER_VARIANTS = {name: index for index, name in enumerate(WATER_SHORES)}
+"""Water's texture variant index for each shore name."""
+
+# Amount of texture variants of every block type. Block IDs are assigned in
+# this order, starting from 1.
+VARIANTS_COUNTS = {
+    "desk": 1,
+    "dirt": 10,
+    "flower": 7,
+    "grass": 10,
+    "rock": 5,
+    "stone": 2,
+    "water": len(WATER_SHORES),
+    "wood": 5,
+}
+
+BLOCK_IDS = {name: block_id for block_id, name in enumerate(VARIANTS_COUNTS, 1)}
+WATER_ID = BLOCK_IDS["water"]
+
+ENVIRONMENT_OBJECTS = ["flower", "rock", "wood"]
+
+
+def get_id(name: str | None) -> int:
+    """Returns block ID of block type name (EMPTY_ID for None)."""
+    if name is None:
+        return EMPTY_ID
+    return BLOCK_IDS[name]
+
+
+def pick_variant(name: str, rng: random.Random | None = None) -> int:
+    """
+    Texture variant index for newly placed block of this type. Drawn from rng
+    (global random if not given).
+    """
+    if name == "water":
+        return WATER_VARIANTS["full"]
+    return (rng or random).randrange(VARIANTS_COUNTS[name])
+
+
+def random_env_object(rng: random.Random | None = None) -> str:
+    return (rng or random).choice(ENVIRONMENT_OBJECTS)
@@ -4,12 +4,26 @@ from modules import position
 from modules import settings
 
 from functools import lru_cache
-from typing import Any
+import numpy as np
 import pygame
 import time
 
 
-FACE_MAP = open("./res/face_map.txt").read().split("\n")
+FACE_NAMES = {
+    "0": position.BlockFace.NONE,
+    "T": position.BlockFace.TOP,
+    "L": position.BlockFace.LEFT,
+    "R": position.BlockFace.RIGHT,
+}
+
+# BlockFace of every [y, x] pixel of a block's texture.
+FACE_MAP = np.array(
+    [
+        [FACE_NAMES[face_name] for face_name in row]
+        for row in open("./res/face_map.txt").read().split("\n")
+    ],
+    dtype=np.int8,
+)
 
 
 class CombinedRange:
@@ -37,6 +51,51 @@ def calc_tile_pos(x: int, y: int, z: int) -> tuple[int, int]:
     return new_x, new_y
 
 
+TILE_SIZE = 64
+
+
+def tiles_in_rect(rect: pygame.Rect, z: int) -> tuple[range, range]:
+    """
+    Returns ranges of U (x - y) and V (x + y) values of tiles at Z level
+    which screen rects (see calc_tile_pos) overlap with rect.
+    """
+    offset_x = -32 + settings.SCREEN_WIDTH // 2
+    offset_y = -16 * z + settings.SCREEN_HEIGHT // 3
+    u_range = range(
+        (rect.left - offset_x - TILE_SIZE) // 32 + 1,
+        (rect.right - offset_x - 1) // 32 + 1,
+    )
+    v_range = range(
+        (rect.top - offset_y - TILE_SIZE) // 16 + 1,
+        (rect.bottom - offset_y - 1) // 16 + 1,
+    )
+    return u_range, v_range
+
+
+def tiles_at_point(px: int, py: int, z: int) -> list[tuple[int, int]]:
+    """(X, Y) of tiles at Z level which screen rects contain point (PX, PY)."""
+    u_range, v_range = tiles_in_rect(pygame.Rect(px, py, 1, 1), z)
+    return [
+        ((u + v) // 2, (v - u) // 2)
+        for u in u_range
+        for v in v_range
+        if (u + v) % 2 == 0
+    ]
+
+
+def merge_rects(rects: list[pygame.Rect]) -> list[pygame.Rect]:
+    """Joins overlapping rects together until none of them overlap."""
+    merged: list[pygame.Rect] = []
+    for rect in rects:
+        rect = rect.copy()
+        overlapping = rect.collidelist(merged)
+        while overlapping != -1:
+            rect.union_ip(merged.pop(overlapping))
+            overlapping = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
 def rect_ranges(rect: pygame.Rect) -> tuple[range, range]:
     """Returns X and Y values as ranges."""
     return (
@@ -56,41 +115,42 @@ def rects_intersection(r1: pygame.Rect, r2: pygame.Rect) -> pygame.Rect:
 
 def is_in_real_rect(x: int, y: int, r: pygame.Rect) -> bool:
     """Checks if mouse cursor is in block's real rect (avoiding transparent)."""
-    mx = x - r.x
-    my = y - r.y
-
-    if mx not in range(0, 64) or my not in range(0, 64):
-        return False
+    return calc_block_face(x, y, r) != position.BlockFace.NONE
 
-    face = FACE_MAP[my][mx]
-    return face != "0"
 
-
-def calc_block_face(x: int, y: int, r: pygame.Rect) -> position.BlockFace | None:
+def calc_block_face(x: int, y: int, r: pygame.Rect) -> position.BlockFace:
     """Check on wich block's face cursor is poiting."""
     mx = x - r.x
     my = y - r.y
 
-    face_name = FACE_MAP[my][mx]
+    if not (0 <= mx < TILE_SIZE and 0 <= my < TILE_SIZE):
+        return position.BlockFace.NONE
+    return FACE_MAP.item(my, mx)
 
-    return {
-        "0": position.BlockFace.NONE,
-        "T": position.BlockFace.TOP,
-        "L": position.BlockFace.LEFT,
-        "R": position.BlockFace.RIGHT,
-    }.get(face_name)
 
+def calc_blocks_faces(points, origins) -> np.ndarray:
+    """
+    Vectorized calc_block_face for many (point, block's rect top-left) pairs.
+    Points and origins are (N, 2) arrays or a single pair broadcasted to the
+    other. Returns BlockFace values (NONE if point is outside of the rect).
+    """
+    offsets = np.asarray(points) - np.asarray(origins)
+    mx, my = offsets[..., 0], offsets[..., 1]
+    inside = (mx >= 0) & (mx < TILE_SIZE) & (my >= 0) & (my < TILE_SIZE)
+
+    faces = np.full(inside.shape, position.BlockFace.NONE, dtype=np.int8)
+    faces[inside] = FACE_MAP[my[inside], mx[inside]]
+    return faces
 
-def flatten2d(list2d: list[list[Any]]) -> list:
-    """Flattens 2-dimensional array."""
-    return [x for xs in list2d for x in xs]
 
+def lowest_bit(mask: int) -> int:
+    """Index of the lowest set bit in mask (-1 if mask is 0)."""
+    return (mask & -mask).bit_length() - 1
 
-def is_all_none(arr: list[Any] | list[list[Any]]) -> bool:
-    """Determines if all items in array are NoneType. Accepts 1d and 2d lists."""
-    if isinstance(arr[0], list):
-        arr = flatten2d(arr)
-    return arr.count(None) == len(arr)
+
+def highest_bit(mask: int) -> int:
+    """Index of the highest set bit in mask (-1 if mask is 0)."""
+    return mask.bit_length() - 1
 
 
 def get_bounding_chunks_pos(x: int, y: int) -> list[tuple[int, int]]:
@@ -112,21 +172,18 @@ def get_cross_bounding_pos(
     pos: position.Coordinate,
 ) -> dict[position.AngleDirection, position.Coordinate]:
     """Returns all voxels positions on the N,S,W,E positions from pos."""
-    bounding = {}
-    for angle, p in {
-        position.AngleDirection.N: pos.add_y(-1),
-        position.AngleDirection.E: pos.add_x(1),
-        position.AngleDirection.S: pos.add_y(1),
-        position.AngleDirection.W: pos.add_x(-1),
-    }.items():
-        if (
-            pos.x >= 0
-            and pos.y >= 0
-            and pos.x < settings.CHUNK_SIZE
-            and pos.y < settings.CHUNK_SIZE
-        ):
-            bounding.update({angle: p})
-    return bounding
+    if not (
+        pos.x >= 0
+        and pos.y >= 0
+        and pos.x < settings.CHUNK_SIZE
+        and pos.y < settings.CHUNK_SIZE
+    ):
+        return {}
+
+    return {
+        angle: pos.offset(offset_x, offset_y)
+        for angle, (offset_x, offset_y) in position.CROSS_OFFSETS.items()
+    }
 
 
 def calc_time_bg_index() -> int:
@@ -142,8 +199,19 @@ def calc_time_bg_index() -> int:
     return 0
 
 
-def get_outline(image: pygame.Surface, color=(239, 149, 37)) -> pygame.Surface:
-    """Creates outline of any pygame's Surface object."""
+HIGHLIGHT_OUTLINE_COLOR = (239, 149, 37)
+GHOST_OUTLINE_COLOR = (255, 255, 255, 80)
+PICK_OUTLINE_COLOR = (250, 50, 50)
+
+
+@lru_cache(maxsize=256)
+def get_outline(
+    image: pygame.Surface, color=HIGHLIGHT_OUTLINE_COLOR
+) -> pygame.Surface:
+    """
+    Creates outline of any pygame's Surface object. Outlines are cached by
+    image and color, so returned Surface is shared and must not be modified.
+    """
     rect = image.get_rect()
     mask = pygame.mask.from_surface(image)
     outline = mask.outline()
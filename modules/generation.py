@@ -2,70 +2,181 @@
 
 from modules import position
 from modules import settings
-from modules import voxels
+from modules import blocks
 from modules import saves
 from modules import calc
 
-from perlin_noise import PerlinNoise
+from multiprocessing import shared_memory
+from typing import Sequence
+import numpy as np
 import random
+import math
 
 
 PERLIN_MIN = -0.5
 PERLIN_MAX = 0.5
 
-def normalize_noise(value: float) -> float:
-    if value < PERLIN_MIN:
-        value = PERLIN_MIN
-    if value > PERLIN_MAX:
-        value = PERLIN_MAX
+def normalize_noise(values: np.ndarray) -> np.ndarray:
+    return np.round(np.clip(values, PERLIN_MIN, PERLIN_MAX), 2)
+
+
+def fade(value: float) -> float:
+    """Smooths [0, 1] value."""
+    return 6 * math.pow(value, 5) - 15 * math.pow(value, 4) + 10 * math.pow(value, 3)
+
+
+class GridNoise:
+    """
+    2D Perlin noise sampled on whole grids of points at once with NumPy.
+    Gives the same values as perlin_noise.PerlinNoise with equal octaves
+    and seed. (Gradients are seeded the same way)
+    """
+
+    def __init__(self, octaves: float, seed: int) -> None:
+        self.octaves = octaves
+        self.seed = seed
+        self.__gradients: dict[tuple[int, int], tuple[float, float]] = {}
+
+    def get_gradient(self, x: int, y: int) -> tuple[float, float]:
+        """Random gradient vector of lattice point (X, Y)."""
+        gradient = self.__gradients.get((x, y))
+        if gradient is None:
+            rng = random.Random(self.seed * max(1, abs(x + 10 * y + 1)))
+            gradient = (rng.uniform(-1, 1), rng.uniform(-1, 1))
+            self.__gradients[(x, y)] = gradient
+        return gradient
+
+    def grid(self, xs: Sequence[float], ys: Sequence[float]) -> np.ndarray:
+        """Noise values of every (x, y) point indexed as [y index, x index]."""
+        xs = [x * self.octaves for x in xs]
+        ys = [y * self.octaves for y in ys]
+        cells_x = [math.floor(x) for x in xs]
+        cells_y = [math.floor(y) for y in ys]
+
+        values = np.zeros((len(ys), len(xs)))
+        for corner_x in (0, 1):
+            for corner_y in (0, 1):
+                lattice_x = [cell + corner_x for cell in cells_x]
+                lattice_y = [cell + corner_y for cell in cells_y]
+
+                # Distances and fades are separable, only computed per axis.
+                dists_x = np.array([x - lx for x, lx in zip(xs, lattice_x)])
+                dists_y = np.array([y - ly for y, ly in zip(ys, lattice_y)])
+                weights_x = np.array([fade(1 - abs(dist)) for dist in dists_x.tolist()])
+                weights_y = np.array([fade(1 - abs(dist)) for dist in dists_y.tolist()])
+
+                # Gradients of the few distinct lattice points.
+                unique_x, index_x = np.unique(lattice_x, return_inverse=True)
+                unique_y, index_y = np.unique(lattice_y, return_inverse=True)
+                gradients = np.array(
+                    [
+                        [self.get_gradient(int(lx), int(ly)) for lx in unique_x]
+                        for ly in unique_y
+                    ]
+                )[index_y[:, None], index_x[None, :]]
+
+                weights = weights_x[None, :] * weights_y[:, None]
+                dots = (
+                    gradients[..., 0] * dists_x[None, :]
+                    + gradients[..., 1] * dists_y[:, None]
+                )
+                values += weights * dots
 
-    return round(value, 2)
+        return values
 
 
-height_noise = PerlinNoise(octaves=1.75, seed=settings.SEED)
+height_noise = GridNoise(octaves=1.75, seed=settings.SEED)
 
 
 def generate_chunk_noise(
-    chunk_x: int, chunk_y: int, noise: PerlinNoise = height_noise
+    chunk_x: int, chunk_y: int, noise: GridNoise | None = None
 ) -> list[list[float]]:
     """Generates 2D list of height values for individual chunk based on it's (X, Y)"""
+    noise = noise or height_noise
     size = settings.CHUNK_SIZE
-    
-    perlin_map = [
-        [
-            normalize_noise(noise([x / size, y / size]))
-            for x in range((size * chunk_x), (size * chunk_x + size))
-        ]
-        for y in range((size * chunk_y + size), (size * chunk_y), -1)
-    ]
-    return perlin_map
+    xs = [x / size for x in range((size * chunk_x), (size * chunk_x + size))]
+    ys = [y / size for y in range((size * chunk_y + size), (size * chunk_y), -1)]
+    return normalize_noise(noise.grid(xs, ys)).tolist()
 
 
 WATER_HEIGHT = range(1, 3)
 VOXELS_GENERATION_MAP = {
-    range(0, 1): voxels.V_Stone,
-    range(1, 3): voxels.V_Dirt,
-    range(3, 12): voxels.V_Grass,
+    range(0, 1): "stone",
+    range(1, 3): "dirt",
+    range(3, 12): "grass",
     range(12, settings.CHUNK_MAX_HEIGHT): None,
 }
 
 
-def generate_chunk(chunk_x: int, chunk_y: int) -> list[list[list[voxels.Voxel | None]]]:
-    """Generates 3D array of voxels for specific chunk."""
+GRID_SHAPE = (settings.CHUNK_MAX_HEIGHT, settings.CHUNK_SIZE, settings.CHUNK_SIZE)
+
+
+def chunk_rng(chunk_x: int, chunk_y: int, stream: str = "terrain") -> random.Random:
+    """
+    Chunk's own random stream derived from seed and chunk's (X, Y), so chunk's
+    content doesn't depend on the order (or process) chunks are generated in.
+    """
+    return random.Random(f"{settings.SEED}.{chunk_x}.{chunk_y}.{stream}")
+
+
+def new_blocks_grid() -> np.ndarray:
+    """Creates empty (Z, Y, X) grid of block IDs / texture variants."""
+    return np.zeros(GRID_SHAPE, dtype=np.uint8)
+
+
+def put_block(
+    grids: tuple[np.ndarray, np.ndarray],
+    name: str | None,
+    x: int,
+    y: int,
+    z: int,
+    rng: random.Random,
+    variant: int | None = None,
+) -> None:
+    """
+    Puts block type name (None for empty) into block IDs and variants grids.
+    Variant is drawn from rng if not given.
+    """
+    block_ids, variants = grids
+    block_ids[z, y, x] = blocks.get_id(name)
+    if name is not None:
+        if variant is None:
+            variant = blocks.pick_variant(name, rng)
+        variants[z, y, x] = variant
+
+
+def generate_chunk(chunk_x: int, chunk_y: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Generates block IDs grid and texture variants grid for specific chunk
+    (with saved changes applied). Both grids are indexed as [z, y, x].
+    """
+    grids = (new_blocks_grid(), new_blocks_grid())
+    generate_terrain(chunk_x, chunk_y, grids)
+    apply_saved_changes(chunk_x, chunk_y, grids)
+    return grids
+
+
+def generate_terrain(
+    chunk_x: int, chunk_y: int, grids: tuple[np.ndarray, np.ndarray]
+) -> None:
+    """Generates chunk's terrain into empty block IDs and variants grids."""
     noise = generate_chunk_noise(chunk_x, chunk_y)
+    rng = chunk_rng(chunk_x, chunk_y)
 
     min_height = 1
     max_height = settings.CHUNK_MAX_HEIGHT // 1.5
 
-    voxels_map = []
+    block_ids, variants = grids
+
+    def put(
+        name: str | None, x: int, y: int, z: int, variant: int | None = None
+    ) -> None:
+        put_block(grids, name, x, y, z, rng, variant)
+
     water_positions = []
     possible_unfilled_water: list[position.Coordinate] = []
     for z in range(settings.CHUNK_MAX_HEIGHT):
-        voxels_y = []
-
         for y in range(settings.CHUNK_SIZE):
-            voxels_x = []
-
             for x in range(settings.CHUNK_SIZE):
                 highest = round(
                     calc.interpolation(
@@ -75,49 +186,41 @@ def generate_chunk(chunk_x: int, chunk_y: int) -> list[list[list[voxels.Voxel |
 
                 # Add enviroment objects.
                 if z == highest + 1:
-                    if random.randint(1, 35) == 1 and not isinstance(
-                        voxels_map[z - 1][y][x], voxels.V_Water
+                    if (
+                        rng.randint(1, 35) == 1
+                        and block_ids[z - 1, y, x] != blocks.WATER_ID
                     ):
-                        voxels_x.append(
-                            voxels.random_env_object(position.Coordinate(x, y, z))
-                        )
+                        put(blocks.random_env_object(rng), x, y, z)
                         continue
 
                 if z > highest:
-                    if isinstance(voxels_map[z - 1][y][x], voxels.V_Water):
+                    if block_ids[z - 1, y, x] == blocks.WATER_ID:
                         pos = position.Coordinate(x, y, z)
                         possible_unfilled_water.append(pos)
-
-                    voxels_x.append(None)
                     continue
 
-                voxel = None
-                for z_range, voxel_type in VOXELS_GENERATION_MAP.items():
+                name, variant = None, None
+                for z_range, block_name in VOXELS_GENERATION_MAP.items():
                     if z in z_range:
-                        if voxel_type is None:
+                        if block_name is None:
                             break
-                        voxel = voxel_type(position.Coordinate(x, y, z))
+                        variant = blocks.pick_variant(block_name, rng)
+                        name = block_name
 
                 if highest in WATER_HEIGHT and z in WATER_HEIGHT:
                     pos = position.Coordinate(x, y, z)
-                    voxel = voxels.V_Water(pos)
+                    name, variant = "water", None
                     water_positions.append(pos)
 
-                voxels_x.append(voxel)
-            voxels_y.append(voxels_x)
-        voxels_map.append(voxels_y)
+                put(name, x, y, z, variant)
 
     # Fill possibly unfilled water positions.
     for possible_pos in possible_unfilled_water:
         for bound_pos in calc.get_cross_bounding_pos(possible_pos).values():
             try:
-                if isinstance(
-                    voxels_map[bound_pos.z][bound_pos.y][bound_pos.x], voxels.V_Water
-                ):
+                if block_ids[bound_pos.z, bound_pos.y, bound_pos.x] == blocks.WATER_ID:
                     water_positions.append(possible_pos)
-                    voxels_map[possible_pos.z][possible_pos.y][possible_pos.x] = (
-                        voxels.V_Water(possible_pos)
-                    )
+                    put("water", possible_pos.x, possible_pos.y, possible_pos.z)
                     break
 
             except IndexError:
@@ -128,31 +231,58 @@ def generate_chunk(chunk_x: int, chunk_y: int) -> list[list[list[voxels.Voxel |
         bound_angles = []
 
         top_pos = water_pos.add_z(1)
-        if isinstance(voxels_map[top_pos.z][top_pos.y][top_pos.x], voxels.V_Water):
+        if block_ids[top_pos.z, top_pos.y, top_pos.x] == blocks.WATER_ID:
             continue
 
-        for angle, pos in calc.get_cross_bounding_pos(water_pos).items():
-            pos = pos.add_z(1)
+        for angle, pos in calc.get_cross_bounding_pos(top_pos).items():
             try:
-                if voxels_map[pos.z][pos.y][pos.x] is not None:
+                if block_ids[pos.z, pos.y, pos.x] != blocks.EMPTY_ID:
                     bound_angles.append(angle)
             except IndexError:
                 pass
 
         angle_name = position.combine_angles_str(bound_angles)
-        new_texture = voxels.WATER_TEXTURES.get(angle_name)
-        if new_texture:
-            new_texture = new_texture.convert_alpha()
-            voxels_map[water_pos.z][water_pos.y][water_pos.x].texture = new_texture
+        if angle_name in blocks.WATER_VARIANTS:
+            variants[water_pos.z, water_pos.y, water_pos.x] = (
+                blocks.WATER_VARIANTS[angle_name]
+            )
+
 
-    # Apply difference from save.
+def apply_saved_changes(
+    chunk_x: int, chunk_y: int, grids: tuple[np.ndarray, np.ndarray]
+) -> None:
+    """Applies chunk's difference from save to it's grids."""
     if saves.has_chunk(chunk_x, chunk_y):
+        rng = chunk_rng(chunk_x, chunk_y, "save")
         diff = saves.get_chunk(chunk_x, chunk_y)
         for raw_pos, voxel_name in diff.items():
-            x, y, z = raw_pos.split(".")
-            x, y, z = int(x), int(y), int(z)
-            coords = position.Coordinate(x, y, z)
-            voxel = voxels.Voxel.from_name(voxel_name, coords)
-            voxels_map[z][y][x] = voxel
+            if voxel_name not in blocks.BLOCK_IDS:
+                voxel_name = None
+            x, y, z = position.Coordinate.from_str(raw_pos)
+            put_block(grids, voxel_name, x, y, z, rng)
+
+
+SHARED_GRIDS_SIZE = 2 * math.prod(GRID_SHAPE)
+
+
+def shared_grids(memory: shared_memory.SharedMemory) -> tuple[np.ndarray, np.ndarray]:
+    """Block IDs and variants grids stored in shared memory block (not copied)."""
+    grids = np.ndarray((2, *GRID_SHAPE), dtype=np.uint8, buffer=memory.buf)
+    return grids[0], grids[1]
+
+
+def init_worker(seed: int) -> None:
+    """Initializes generation worker process with the main process' seed."""
+    global height_noise
+    settings.SEED = seed
+    height_noise = GridNoise(octaves=1.75, seed=seed)
+
 
-    return voxels_map
+def generate_shared_terrain(chunk_x: int, chunk_y: int, memory_name: str) -> None:
+    """
+    Generates chunk's terrain in worker process into (empty) shared memory
+    block allocated by the main process.
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    generate_terrain(chunk_x, chunk_y, shared_grids(memory))
+    memory.close()
@@ -24,6 +24,14 @@ class Particle:
 active_particles: list[Particle] = []
 
 
+def group_by_position() -> dict[position.Coordinate, list[Particle]]:
+    """Groups active particles by their position."""
+    grouped = {}
+    for particle in active_particles:
+        grouped.setdefault(particle.pos, []).append(particle)
+    return grouped
+
+
 WATER_PARTICLE_TEXTURES = [
     pygame.image.load("./res/texture/particles/water/0.png").convert_alpha(),
     pygame.image.load("./res/texture/particles/water/1.png").convert_alpha(),
@@ -4,10 +4,15 @@ from __future__ import annotations
 
 from modules import position
 from modules import settings
+from modules import events
 from modules import world
-from modules import calc
 
 from dataclasses import dataclass
+from typing import Callable
+import itertools
+import threading
+import queue
+import heapq
 import math
 
 
@@ -22,8 +27,8 @@ class PF_Node:
     """
     PathFinding node represents position that player can be moved to.
     It contains information about it's parent PF_Node (or None for master node)
-    After checking this node it will possibly gain children - other PF_Node(s).
-    
+    and the cost (length) of the path leading to it from the master node.
+
     The movetype and direction parameters are information how to move to this
       specific node from it's parent. (ex. WALK at 90 degrees)
     """
@@ -32,229 +37,855 @@ class PF_Node:
     pos: position.Coordinate
     direction: position.AngleDirection | None
     movetype: PF_MoveType | None
-    children: list[PF_Node]
-
-    def get_cost(self) -> int:
-        """Calculate node's trace cost (length)."""
-        cost = 1
-        if self.parent is not None:
-            cost += self.parent.get_cost()
-        return cost
-
-    def has_node(self, node: PF_Node) -> bool:
-        """Checks if provided node is one of this node's children node."""
-        if node in self.children:
-            return True
-
-        for child in self.children:
-            if child.has_node(node):
-                return True
-        return False
+    cost: int = 0
+
+
+INF = float("inf")
+
+Move = tuple[position.Coordinate, position.AngleDirection, PF_MoveType]
+"""Position reached by the move, direction and type of the move."""
+
+
+def probe_moves(world: world.ColumnQueries, pos: position.Coordinate) -> list[Move]:
+    """Probes terrain for all moves possible from pos (relative to current chunk)."""
+    moves = []
+
+    for direction, (offset_x, offset_y) in position.CROSS_OFFSETS.items():
+        next_pos = pos.offset(offset_x, offset_y)
 
-    def as_move(self) -> tuple[position.AngleDirection, PF_MoveType]:
-        """Converts this object into move data."""
-        return (self.direction, self.movetype)
+        # Check all next possibilites. Filter unreachable. (Columns of not
+        # loaded chunks are empty)
+        for possibly_reachable_pos in world.reachable_grounds_at(next_pos.x, next_pos.y):
+
+            # Same Z, no colliding voxels on the way.
+            if possibly_reachable_pos.z == pos.z:
+                moves.append((possibly_reachable_pos, direction, PF_MoveType.WALK))
+
+            # Lower Z, requires falling.
+            if possibly_reachable_pos.z < pos.z:
+
+                # Is there colliding voxel disabling move possibility?
+                if not world.is_solid(next_pos.x, next_pos.y, next_pos.z + 1):
+
+                    # Is this the first voxel i will hit when falling?
+                    new_z = world.nearest_lower_ground_at(
+                        next_pos.x, next_pos.y, next_pos.z
+                    )
+                    new_pos = next_pos.with_z(new_z)
+                    if new_pos == possibly_reachable_pos:
+                        moves.append((new_pos, direction, PF_MoveType.FALL_WALK))
+
+            # Higher Z.
+            if possibly_reachable_pos.z > pos.z:
+
+                # Three blocks jump.
+                if possibly_reachable_pos.z == pos.z + 3:
+                    # Is there voxel on the way?
+                    if (
+                        not world.is_solid(pos.x, pos.y, pos.z + 3)
+                        and not world.is_solid(pos.x, pos.y, pos.z + 4)
+                        and not world.is_solid(pos.x, pos.y, pos.z + 5)
+                    ):
+                        moves.append(
+                            (possibly_reachable_pos, direction, PF_MoveType.JUMP_WALK)
+                        )
+
+                # Two blocks jump.
+                if possibly_reachable_pos.z == pos.z + 2:
+                    # Is there voxel on the way?
+                    if (
+                        not world.is_solid(pos.x, pos.y, pos.z + 3)
+                        and not world.is_solid(pos.x, pos.y, pos.z + 4)
+                    ):
+                        moves.append(
+                            (possibly_reachable_pos, direction, PF_MoveType.JUMP_WALK)
+                        )
 
-    def to_moves_sequence(self) -> list[tuple[position.AngleDirection, PF_MoveType]]:
+                # One block elevation.
+                if possibly_reachable_pos.z == pos.z + 1:
+                    # Is there voxel on the way?
+                    if not world.is_solid(pos.x, pos.y, pos.z + 3):
+                        moves.append(
+                            (possibly_reachable_pos, direction, PF_MoveType.WALK)
+                        )
+
+    return moves
+
+
+def probe_world_moves(
+    world: world.ColumnQueries, pos: position.Coordinate
+) -> list[Move]:
+    """probe_moves() for world coordinate pos. Moves are in world coordinates."""
+    moves = probe_moves(world, world.to_relative(pos))
+    return [
+        (world.to_world(next_pos), direction, movetype)
+        for next_pos, direction, movetype in moves
+    ]
+
+
+class NavigationCache:
+    """
+    Navigation graph of every loaded chunk: moves possible from each of the
+    standable cells (in world coordinates). Graph is built lazily by columns
+    and world's edits drop only columns which moves they may change.
+    Can be used from multiple threads.
+    """
+
+    def __init__(self, world: world.World) -> None:
+        self.world = world
+        self.lock = threading.Lock()
+
+        # Chunk's graph by chunk's key. Graph maps column's (X, Y) inside the
+        # chunk to moves from every standable Z in it.
+        self.graphs: dict[tuple[int, int], dict[tuple[int, int], dict]] = {}
+
+        world.change_listeners.append(self.invalidate_at)
+        world.unload_listeners.append(self.invalidate_chunk)
+
+    def get_column(
+        self, x: int, y: int, queries: world.ColumnQueries | None = None
+    ) -> dict[int, list[Move]]:
         """
-        Converts this node and all it's parents into sequence of move data.
-        Sequence starts from master node (start position) and ends on the last node.
+        Moves from every standable Z of world's (X, Y) column. Missing columns
+        are probed with queries (world or it's snapshot) and cached only if up
+        to date.
         """
-        moves = []
-        current_node = self
-        while current_node.parent is not None:
-            moves.append(current_node.as_move())
-            current_node = current_node.parent
-
-        return moves[::-1]
+        queries = queries or self.world
+        size = settings.CHUNK_SIZE
+        chunk_key = (x // size, -(y // size))
+        column_key = (x % size, y % size)
+
+        with self.lock:
+            column = self.graphs.get(chunk_key, {}).get(column_key)
+
+        if column is None:
+            column = self.__build_column(queries, x, y)
+            if self.__is_neighbourhood_loaded(queries, x, y):
+                with self.lock:
+                    if queries.revision == self.world.revision:
+                        self.graphs.setdefault(chunk_key, {})[column_key] = column
+
+        return column
+
+    def get_moves(
+        self, pos: position.Coordinate, queries: world.ColumnQueries | None = None
+    ) -> list[Move]:
+        """All moves possible from world coordinate pos."""
+        moves = self.get_column(pos.x, pos.y, queries).get(pos.z)
+        if moves is None:
+            return probe_world_moves(queries or self.world, pos)
+        return moves
+
+    def __build_column(
+        self, queries: world.ColumnQueries, x: int, y: int
+    ) -> dict[int, list[Move]]:
+        relative = queries.to_relative(position.Coordinate(x, y, 0))
+        return {
+            ground.z: probe_world_moves(queries, position.Coordinate(x, y, ground.z))
+            for ground in queries.reachable_grounds_at(relative.x, relative.y)
+        }
+
+    def __is_neighbourhood_loaded(
+        self, queries: world.ColumnQueries, x: int, y: int
+    ) -> bool:
+        """
+        Check if chunks of column's bounding columns are loaded. (Moves into
+        not loaded chunk would appear after loading it, so are not cached)
+        """
+        relative = queries.to_relative(position.Coordinate(x, y, 0))
+        return all(
+            queries.chunk_key_at(relative.x + offset_x, relative.y + offset_y)
+            in queries.chunks
+            for offset_x, offset_y in position.CROSS_OFFSETS.values()
+        )
+
+    def invalidate_at(self, chunk, coordinate: position.Coordinate) -> None:
+        """Drops cached moves of edited column and it's bounding columns."""
+        size = settings.CHUNK_SIZE
+        x = chunk.x * size + coordinate.x
+        y = -chunk.y * size + coordinate.y
+
+        with self.lock:
+            for offset_x, offset_y in ((0, 0), *position.CROSS_OFFSETS.values()):
+                column_x, column_y = x + offset_x, y + offset_y
+                graph = self.graphs.get((column_x // size, -(column_y // size)))
+                if graph is not None:
+                    graph.pop((column_x % size, column_y % size), None)
+
+    def invalidate_chunk(self, chunk) -> None:
+        """
+        Drops graph of unloaded chunk and moves of bounding chunks' columns
+        bordering with it.
+        """
+        size = settings.CHUNK_SIZE
+        last = size - 1
+
+        # Bordering columns of every bounding chunk.
+        borders = {
+            (chunk.x + 1, chunk.y): [(0, i) for i in range(size)],
+            (chunk.x - 1, chunk.y): [(last, i) for i in range(size)],
+            (chunk.x, chunk.y + 1): [(i, last) for i in range(size)],
+            (chunk.x, chunk.y - 1): [(i, 0) for i in range(size)],
+        }
+
+        with self.lock:
+            self.graphs.pop((chunk.x, chunk.y), None)
+            for chunk_key, columns in borders.items():
+                graph = self.graphs.get(chunk_key)
+                if graph is not None:
+                    for column_key in columns:
+                        graph.pop(column_key, None)
 
 
 class PathFinder:
+    """
+    A* search over positions player can stand on. Every move costs 1. Start
+    and destination are relative to the current chunk, the search itself runs
+    in world coordinates, so the path can lead through all loaded chunks.
+    World can be replaced with it's snapshot to search outside of main thread.
+    """
+
     def __init__(
-        self, start: position.Coordinate, dest: position.Coordinate, world: world.World
+        self,
+        start: position.Coordinate,
+        dest: position.Coordinate,
+        world: world.ColumnQueries,
+        navigation: NavigationCache | None = None,
+        is_cancelled: Callable[[], bool] | None = None,
     ):
         self.start = start
         self.dest = dest
         self.world = world
+        self.navigation = navigation
+        self.is_cancelled = is_cancelled
+
+        self.world_start = world.to_world(start)
+        self.world_dest = world.to_world(dest)
 
-        self.nodes: list[PF_Node] = []
-        self.dest_nodes: list[PF_Node] = []
         self.backup_node: PF_Node | None = None
         self.backup_dist: int = 100
 
-        self.__checked: dict[position.Coordinate : PF_Node] = {}
+        # Discovered nodes by packed position key.
+        self.__nodes: dict[int, PF_Node] = {}
+        self.__closed: set[int] = set()
+
+        # Open set of (estimated total cost, insertion order, node) entries.
+        self.__open: list[tuple[int, int, PF_Node]] = []
+        self.__order = itertools.count()
 
-    def __new_node(
+    def heuristic(self, pos: position.Coordinate) -> int:
+        """
+        Lower bound of moves needed to reach the destination. Every move
+        changes X or Y by one and climbs at most 3 blocks.
+        """
+        dest = self.world_dest
+        distance = abs(dest.x - pos.x) + abs(dest.y - pos.y)
+        climb = -(-(dest.z - pos.z) // 3)
+        return max(distance, climb)
+
+    def __push_node(
         self,
         parent: PF_Node | None,
         pos: position.Coordinate,
         direction: position.AngleDirection | None = None,
         movetype: PF_MoveType | None = None,
-    ) -> PF_Node:
+    ) -> None:
         """
-        Creates new node or uses cached one.
-        Automatically saves it as a closest node if it is one.
+        Creates new node or updates known one if the new path is cheaper and
+        adds it to the open set. Saves it as a closest node if it is one.
         """
-        existing_node = self.__checked.get(pos)
-        if existing_node is not None:
-            return existing_node
-
-        node = PF_Node(parent, pos, direction, movetype, [])
-        self.__checked[pos] = node
-        self.nodes.append(node)
+        cost = 0 if parent is None else parent.cost + 1
+        pos_key = pos.key()
+        node = self.__nodes.get(pos_key)
 
-        goal_dist = math.dist(pos.as_tuple(), self.dest.as_tuple())
-        if goal_dist < self.backup_dist:
-            self.backup_dist = goal_dist
-            self.backup_node = node
+        if node is None:
+            node = PF_Node(parent, pos, direction, movetype, cost)
+            self.__nodes[pos_key] = node
 
-        return node
+            goal_dist = math.dist(pos, self.world_dest)
+            if goal_dist < self.backup_dist:
+                self.backup_dist = goal_dist
+                self.backup_node = node
 
-    def __get_cheapest_node(self, nodes_seq: list[PF_Node]) -> PF_Node | None:
-        """Get the cheapest node from an sequence of nodes."""
-        if not nodes_seq:
-            return None
+        elif cost < node.cost and pos_key not in self.__closed:
+            node.parent = parent
+            node.direction = direction
+            node.movetype = movetype
+            node.cost = cost
 
-        cheapest = nodes_seq[0]
-        cost = cheapest.get_cost()
-        for node in nodes_seq:
-            new_cost = node.get_cost()
-            if new_cost < cost:
-                cost = new_cost
-                cheapest = node
+        else:
+            return
 
-        return node
+        entry = (cost + self.heuristic(pos), next(self.__order), node)
+        heapq.heappush(self.__open, entry)
 
     def find(self) -> PF_Node | None:
         """
-        Finds destination/close path and returns it's PF_Node.
-        
+        Finds destination/close path and returns it's PF_Node. (Nodes' positions
+        are world coordinates) Returns None if search was cancelled.
+
         - destination: Leads exactly to requested point.
         - close: The nearest possible position player can go to.
         """
-        master_node = self.__new_node(None, self.start)
-        for node in self.nodes:
-            self.check_node(node)
+        self.__push_node(None, self.world_start)
+
+        while self.__open:
+            if self.is_cancelled is not None and self.is_cancelled():
+                return None
 
-        dest_node = self.__get_cheapest_node(self.dest_nodes)
-        close_node = self.backup_node
+            _, _, node = heapq.heappop(self.__open)
+            pos_key = node.pos.key()
+            if pos_key in self.__closed:
+                continue
+            self.__closed.add(pos_key)
 
-        if dest_node is not None:
-            return dest_node
+            if node.pos == self.world_dest:
+                return node
 
-        if dest_node is None:
-            if close_node is None and self.backup_node is None:
-                print("No path found...")
-                return None
+            self.check_node(node)
 
-            if close_node is not None:
-                print("No direct path found, using closest...")
-                return close_node
+        if self.backup_node is None:
+            print("No path found...")
+            return None
+
+        print("No direct path found, using closest...")
+        return self.backup_node
 
     def check_node(self, node: PF_Node) -> None:
-        """Finds and saves all next possible moves from this node."""
+        """Adds all next possible moves from this node to the open set."""
+        for next_pos, direction, movetype in self.get_moves(node.pos):
+            self.__push_node(node, next_pos, direction, movetype)
 
-        for direction, next_pos in calc.get_cross_bounding_pos(node.pos).items():
-            # Define all reachable positions and ways to acheive them.
-            actually_reachable = []
+    def get_moves(self, pos: position.Coordinate) -> list[Move]:
+        """All moves possible from world coordinate pos."""
+        if self.navigation is not None:
+            return self.navigation.get_moves(pos, self.world)
+        return probe_world_moves(self.world, pos)
 
-            # Check all next possibilites. Filter unreachable.
-            for possibly_reachable_pos in self.world.reachable_grounds_at(
-                next_pos.x, next_pos.y
-            ):
 
-                # Out of chunk position?
-                if (
-                    possibly_reachable_pos.x < 0
-                    or possibly_reachable_pos.y < 0
-                    or possibly_reachable_pos.x > settings.CHUNK_SIZE
-                    or possibly_reachable_pos.y > settings.CHUNK_SIZE
-                ):
-                    continue
-
-                # Same Z, no colliding voxels on the way.
-                if possibly_reachable_pos.z == node.pos.z:
-                    reachable_node = self.__new_node(
-                        node, possibly_reachable_pos, direction, PF_MoveType.WALK
+class PathPlanner:
+    """
+    D* Lite search of the shortest path from moving start to fixed destination
+    (both in world coordinates). Nodes are expanded backwards from the
+    destination, so after world's edits only the affected nodes are repaired
+    and the path can be continued from any start.
+    """
+
+    def __init__(
+        self,
+        start: position.Coordinate,
+        dest: position.Coordinate,
+        queries: world.ColumnQueries,
+        navigation: NavigationCache,
+        is_cancelled: Callable[[], bool] | None = None,
+    ) -> None:
+        self.start = start
+        self.dest = dest
+        self.queries = queries
+        self.navigation = navigation
+        self.is_cancelled = is_cancelled
+
+        # Cost of the path to destination (g) and it's one step lookahead (rhs).
+        self.__g: dict[position.Coordinate, float] = {}
+        self.__rhs: dict[position.Coordinate, float] = {dest: 0}
+
+        # Heap of (key, insertion order, node) and current keys of queued nodes.
+        self.__open: list[tuple[tuple[float, float], int, position.Coordinate]] = []
+        self.__queued: dict[position.Coordinate, tuple[float, float]] = {}
+        self.__order = itertools.count()
+
+        # Accumulated heuristic change caused by moving the start.
+        self.__key_modifier = 0
+        self.__last_start = start
+
+        self.__update_node(dest)
+
+    def heuristic(self, pos: position.Coordinate) -> int:
+        """Lower bound of moves from start to pos. (Manhattan distance)"""
+        return abs(self.start.x - pos.x) + abs(self.start.y - pos.y)
+
+    def get_successors(self, pos: position.Coordinate) -> list[Move]:
+        return self.navigation.get_column(pos.x, pos.y, self.queries).get(pos.z, [])
+
+    def get_predecessors(self, pos: position.Coordinate) -> list[position.Coordinate]:
+        """Standable positions with a move leading to pos."""
+        predecessors = []
+        for offset_x, offset_y in position.CROSS_OFFSETS.values():
+            column = self.navigation.get_column(
+                pos.x - offset_x, pos.y - offset_y, self.queries
+            )
+            for z, moves in column.items():
+                if any(next_pos == pos for next_pos, _, _ in moves):
+                    predecessors.append(
+                        position.Coordinate(pos.x - offset_x, pos.y - offset_y, z)
                     )
-                    actually_reachable.append(reachable_node)
+        return predecessors
+
+    def __calc_key(self, pos: position.Coordinate) -> tuple[float, float]:
+        cost = min(self.__g.get(pos, INF), self.__rhs.get(pos, INF))
+        return (cost + self.heuristic(pos) + self.__key_modifier, cost)
+
+    def __calc_rhs(self, pos: position.Coordinate) -> float:
+        if pos == self.dest:
+            return 0
+        successors = self.get_successors(pos)
+        return min(
+            (1 + self.__g.get(next_pos, INF) for next_pos, _, _ in successors),
+            default=INF,
+        )
+
+    def __update_node(self, pos: position.Coordinate) -> None:
+        """Queues node if it's inconsistent (g differs from rhs)."""
+        if self.__g.get(pos, INF) != self.__rhs.get(pos, INF):
+            key = self.__calc_key(pos)
+            self.__queued[pos] = key
+            heapq.heappush(self.__open, (key, next(self.__order), pos))
+        else:
+            self.__queued.pop(pos, None)
+
+    def __top(self) -> tuple[tuple[float, float], position.Coordinate] | None:
+        """Lowest key queued node. (Drops outdated heap entries)"""
+        while self.__open:
+            key, _, pos = self.__open[0]
+            if self.__queued.get(pos) == key:
+                return key, pos
+            heapq.heappop(self.__open)
+        return None
+
+    def compute(self, max_expansions: int | None = None) -> bool:
+        """
+        Expands nodes until the path from start is known to be the shortest.
+        Returns False if search was cancelled or stopped after max_expansions
+        nodes (next call continues it).
+        """
+        limit = itertools.count() if max_expansions is None else range(max_expansions)
+        for _ in limit:
+            if self.is_cancelled is not None and self.is_cancelled():
+                return False
+
+            top = self.__top()
+            start_g = self.__g.get(self.start, INF)
+            start_rhs = self.__rhs.get(self.start, INF)
+            if top is None or (
+                top[0] >= self.__calc_key(self.start) and start_rhs <= start_g
+            ):
+                return True
 
-                # Lower Z, requires falling.
-                if possibly_reachable_pos.z < node.pos.z:
+            old_key, pos = top
+            new_key = self.__calc_key(pos)
+            g = self.__g.get(pos, INF)
+            rhs = self.__rhs.get(pos, INF)
+
+            if old_key < new_key:
+                self.__update_node(pos)
+
+            elif g > rhs:
+                self.__g[pos] = rhs
+                self.__queued.pop(pos)
+                for predecessor in self.get_predecessors(pos):
+                    if predecessor != self.dest:
+                        self.__rhs[predecessor] = min(
+                            self.__rhs.get(predecessor, INF), rhs + 1
+                        )
+                    self.__update_node(predecessor)
 
-                    # Is there colliding voxel disabling move possibility?
-                    if not self.world.get_at_coord(next_pos.add_z(1)):
+            else:
+                self.__g[pos] = INF
+                for node in (*self.get_predecessors(pos), pos):
+                    if self.__rhs.get(node, INF) == g + 1 or node == pos:
+                        self.__rhs[node] = self.__calc_rhs(node)
+                    self.__update_node(node)
 
-                        # Is this the first voxel i will hit when falling?
-                        new_z = self.world.nearest_lower_ground_at(
-                            next_pos.x, next_pos.y, next_pos.z
-                        )
-                        new_pos = position.Coordinate(next_pos.x, next_pos.y, new_z)
-                        if new_pos == possibly_reachable_pos:
-
-                            reachable_node = self.__new_node(
-                                node, new_pos, direction, PF_MoveType.FALL_WALK
-                            )
-                            actually_reachable.append(reachable_node)
-
-                # Higher Z.
-                if possibly_reachable_pos.z > node.pos.z:
-
-                    # Is this block reachable from current height.
-                    if possibly_reachable_pos.z <= node.pos.z + 3:
-                        # Three blocks jump.
-                        if possibly_reachable_pos.z == node.pos.z + 3:
-                            # Is there voxel on the way?
-                            if (
-                                self.world.get_at_coord(node.pos.add_z(3)) is None
-                                and self.world.get_at_coord(node.pos.add_z(4)) is None
-                                and self.world.get_at_coord(node.pos.add_z(5)) is None
-                            ):
-
-                                reachable_node = self.__new_node(
-                                    node,
-                                    possibly_reachable_pos,
-                                    direction,
-                                    PF_MoveType.JUMP_WALK,
-                                )
-                                actually_reachable.append(reachable_node)
-
-                        # Two blocks jump.
-                        if possibly_reachable_pos.z == node.pos.z + 2:
-                            # Is there voxel on the way?
-                            if (
-                                self.world.get_at_coord(node.pos.add_z(3)) is None
-                                and self.world.get_at_coord(node.pos.add_z(4)) is None
-                            ):
-
-                                reachable_node = self.__new_node(
-                                    node,
-                                    possibly_reachable_pos,
-                                    direction,
-                                    PF_MoveType.JUMP_WALK,
-                                )
-                                actually_reachable.append(reachable_node)
-
-                        # One block elevation.
-                        if possibly_reachable_pos.z == node.pos.z + 1:
-                            # Is there voxel on the way?
-                            if self.world.get_at_coord(node.pos.add_z(3)) is None:
-                                reachable_node = self.__new_node(
-                                    node,
-                                    possibly_reachable_pos,
-                                    direction,
-                                    PF_MoveType.WALK,
-                                )
-                                actually_reachable.append(reachable_node)
-
-            # Dead end.
-            if not actually_reachable:
+        return False
+
+    def get_cost(self) -> float:
+        """Length of the shortest path from start. (INF if there is no path)"""
+        return self.__rhs.get(self.start, INF)
+
+    def has_path(self) -> bool:
+        return self.get_cost() != INF
+
+    def next_move(self) -> Move | None:
+        """The first move of the shortest path from start. (None if no path)"""
+        best_move, best_cost = None, INF
+        for move in self.get_successors(self.start):
+            cost = 1 + self.__g.get(move[0], INF)
+            if cost < best_cost:
+                best_move, best_cost = move, cost
+        return best_move
+
+    def move_start(self, start: position.Coordinate) -> None:
+        """Continues the path from new start."""
+        if start == self.start:
+            return
+        self.start = start
+        self.__key_modifier += self.heuristic(self.__last_start)
+        self.__last_start = start
+
+    def update_columns(self, columns: set[tuple[int, int]]) -> None:
+        """
+        Repairs nodes of changed world's (X, Y) columns. Their moves (and
+        moves leading to them) may have changed.
+        """
+        nodes = {pos for pos in (*self.__g, *self.__rhs) if (pos.x, pos.y) in columns}
+        for x, y in columns:
+            for z in self.navigation.get_column(x, y, self.queries):
+                nodes.add(position.Coordinate(x, y, z))
+
+        for node in nodes:
+            self.__rhs[node] = self.__calc_rhs(node)
+            self.__update_node(node)
+
+
+def plan_path(
+    start: position.Coordinate,
+    dest: position.Coordinate,
+    queries: world.ColumnQueries,
+    navigation: NavigationCache,
+    is_cancelled: Callable[[], bool] | None = None,
+) -> PathPlanner | None:
+    """
+    Plans path between start and dest (relative to the current chunk). If the
+    destination is unreachable, plans path to the closest reachable position.
+    Returns None if there is no path or search was cancelled.
+    """
+    world_start = queries.to_world(start)
+    planner = PathPlanner(
+        world_start, queries.to_world(dest), queries, navigation, is_cancelled
+    )
+    if not planner.compute():
+        return None
+
+    if not planner.has_path():
+        pathfinder = PathFinder(start, dest, queries, navigation, is_cancelled)
+        closest_node = pathfinder.find()
+        if closest_node is None or closest_node.pos == world_start:
+            return None
+
+        planner = PathPlanner(
+            world_start, closest_node.pos, queries, navigation, is_cancelled
+        )
+        if not planner.compute():
+            return None
+
+    return planner
+
+
+def world_chunk_key(x: int, y: int) -> tuple[int, int]:
+    """Key of chunk containing world's (X, Y)."""
+    return (x // settings.CHUNK_SIZE, -(y // settings.CHUNK_SIZE))
+
+
+def get_route_chunks(
+    start: position.Coordinate, dest: position.Coordinate
+) -> set[tuple[int, int]]:
+    """
+    Keys of chunks a route between world coordinates start and dest is
+    searched through: chunks on the straight line between them and their
+    bounding chunks.
+    """
+    start_x, start_y = world_chunk_key(start.x, start.y)
+    dest_x, dest_y = world_chunk_key(dest.x, dest.y)
+    steps = max(abs(dest_x - start_x), abs(dest_y - start_y), 1)
+
+    keys = set()
+    for step in range(steps + 1):
+        x = start_x + round((dest_x - start_x) * step / steps)
+        y = start_y + round((dest_y - start_y) * step / steps)
+        for offset_x in (-1, 0, 1):
+            for offset_y in (-1, 0, 1):
+                keys.add((x + offset_x, y + offset_y))
+    return keys
+
+
+Portal = tuple[position.Coordinate, position.Coordinate]
+"""Move crossing chunk's border: position in the chunk and position behind it."""
+
+
+class PortalCache:
+    """
+    Chunk-level abstraction of the navigation graph. Every chunk's border
+    crossings are grouped into entrances with a single representative portal
+    and distances between cells inside chunks are cached, so long routes are
+    searched over portals instead of cells. Can be used from multiple threads.
+    """
+
+    def __init__(self, navigation: NavigationCache) -> None:
+        self.navigation = navigation
+        self.world = navigation.world
+        self.lock = threading.Lock()
+
+        # Chunk's portals and keys of it's loaded bounding chunks they were
+        # found with (crossings into not loaded chunks are missing).
+        self.portals: dict[tuple[int, int], tuple[frozenset, list[Portal]]] = {}
+
+        # Distances from cell to every cell of it's chunk reachable without
+        # leaving the chunk, by chunk's key.
+        self.distances: dict[tuple[int, int], dict[position.Coordinate, dict]] = {}
+
+        self.world.change_listeners.append(self.invalidate_at)
+        self.world.unload_listeners.append(self.invalidate_chunk)
+
+    def get_portals(
+        self, chunk_key: tuple[int, int], queries: world.ColumnQueries
+    ) -> list[Portal]:
+        """Portals leading out of chunk."""
+        chunk_x, chunk_y = chunk_key
+        bounding = (
+            (chunk_x + 1, chunk_y),
+            (chunk_x - 1, chunk_y),
+            (chunk_x, chunk_y + 1),
+            (chunk_x, chunk_y - 1),
+        )
+        loaded = frozenset(key for key in bounding if key in queries.chunks)
+
+        with self.lock:
+            cached = self.portals.get(chunk_key)
+        if cached is not None and cached[0] == loaded:
+            return cached[1]
+
+        portals = self.__find_portals(chunk_key, queries)
+        with self.lock:
+            if queries.revision == self.world.revision:
+                self.portals[chunk_key] = (loaded, portals)
+        return portals
+
+    def __find_portals(
+        self, chunk_key: tuple[int, int], queries: world.ColumnQueries
+    ) -> list[Portal]:
+        size = settings.CHUNK_SIZE
+        origin_x, origin_y = chunk_key[0] * size, -chunk_key[1] * size
+        portals = []
+
+        for direction, (offset_x, offset_y) in position.CROSS_OFFSETS.items():
+            # Border's columns in the chunk, ordered along the border.
+            if offset_x:
+                border_x = origin_x + (size - 1 if offset_x > 0 else 0)
+                border = [(border_x, origin_y + i) for i in range(size)]
+            else:
+                border_y = origin_y + (size - 1 if offset_y > 0 else 0)
+                border = [(origin_x + i, border_y) for i in range(size)]
+
+            crossings = []
+            for x, y in border:
+                column = self.navigation.get_column(x, y, queries)
+                crossings.append(
+                    [
+                        (position.Coordinate(x, y, z), next_pos)
+                        for z, moves in column.items()
+                        for next_pos, move_direction, _ in moves
+                        if move_direction == direction
+                    ]
+                )
+
+            # Continuous stretch of crossings is an entrance, it's middle
+            # crossings represent it.
+            run_start = None
+            for i, column_crossings in enumerate([*crossings, []]):
+                if column_crossings and run_start is None:
+                    run_start = i
+                if not column_crossings and run_start is not None:
+                    portals.extend(crossings[(run_start + i - 1) // 2])
+                    run_start = None
+
+        return portals
+
+    def get_distances(
+        self, cell: position.Coordinate, queries: world.ColumnQueries
+    ) -> dict[position.Coordinate, int]:
+        """
+        Number of moves from world coordinate cell to every cell of it's chunk
+        reachable without leaving the chunk.
+        """
+        chunk_key = world_chunk_key(cell.x, cell.y)
+        with self.lock:
+            distances = self.distances.get(chunk_key, {}).get(cell)
+        if distances is not None:
+            return distances
+
+        # Breadth-first search, every move costs 1.
+        distances = {cell: 0}
+        frontier = [cell]
+        while frontier:
+            next_frontier = []
+            for pos in frontier:
+                for next_pos, _, _ in self.navigation.get_moves(pos, queries):
+                    if next_pos in distances:
+                        continue
+                    if world_chunk_key(next_pos.x, next_pos.y) != chunk_key:
+                        continue
+                    distances[next_pos] = distances[pos] + 1
+                    next_frontier.append(next_pos)
+            frontier = next_frontier
+
+        with self.lock:
+            if queries.revision == self.world.revision:
+                self.distances.setdefault(chunk_key, {})[cell] = distances
+        return distances
+
+    def invalidate_at(self, chunk, coordinate: position.Coordinate) -> None:
+        """
+        Drops distances inside edited chunk and portals of it and of chunks
+        bordering with edited column.
+        """
+        size = settings.CHUNK_SIZE
+        x = chunk.x * size + coordinate.x
+        y = -chunk.y * size + coordinate.y
+
+        with self.lock:
+            self.distances.pop((chunk.x, chunk.y), None)
+            for offset_x, offset_y in ((0, 0), *position.CROSS_OFFSETS.values()):
+                self.portals.pop(world_chunk_key(x + offset_x, y + offset_y), None)
+
+    def invalidate_chunk(self, chunk) -> None:
+        """Drops portals and distances of unloaded chunk."""
+        with self.lock:
+            self.portals.pop((chunk.x, chunk.y), None)
+            self.distances.pop((chunk.x, chunk.y), None)
+
+
+def plan_route(
+    start: position.Coordinate,
+    dest: position.Coordinate,
+    queries: world.ColumnQueries,
+    portals: PortalCache,
+    is_cancelled: Callable[[], bool] | None = None,
+) -> list[position.Coordinate] | None:
+    """
+    A* search of chunk-level route between world coordinates start and dest
+    over portals of loaded chunks. Returns route's waypoints: the first cell
+    behind every crossed chunk's border followed by the destination. Returns
+    None if there is no route or search was cancelled.
+    """
+
+    def heuristic(pos: position.Coordinate) -> int:
+        return abs(dest.x - pos.x) + abs(dest.y - pos.y)
+
+    costs = {start: 0}
+    parents: dict[position.Coordinate, position.Coordinate | None] = {start: None}
+    closed = set()
+    order = itertools.count()
+    open_cells = [(heuristic(start), next(order), start)]
+
+    while open_cells:
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        _, _, cell = heapq.heappop(open_cells)
+        if cell in closed:
+            continue
+        closed.add(cell)
+
+        if cell == dest:
+            route = []
+            while parents[cell] is not None:
+                route.append(cell)
+                cell = parents[cell]
+            return route[::-1]
+
+        distances = portals.get_distances(cell, queries)
+        edges = []
+        if dest in distances:
+            edges.append((dest, distances[dest]))
+        for exit_pos, entry_pos in portals.get_portals(
+            world_chunk_key(cell.x, cell.y), queries
+        ):
+            if exit_pos in distances:
+                edges.append((entry_pos, distances[exit_pos] + 1))
+
+        for next_cell, edge_cost in edges:
+            cost = costs[cell] + edge_cost
+            if next_cell in closed or cost >= costs.get(next_cell, INF):
+                continue
+            costs[next_cell] = cost
+            parents[next_cell] = cell
+            entry = (cost + heuristic(next_cell), next(order), next_cell)
+            heapq.heappush(open_cells, entry)
+
+    return None
+
+
+class PathfindWorker:
+    """
+    Plans paths and routes on world's snapshots in a background thread.
+    Results are delivered through the main events loop. Submitting new search
+    (or cancelling) drops the outstanding one.
+    """
+
+    def __init__(self, navigation: NavigationCache, portals: PortalCache) -> None:
+        self.navigation = navigation
+        self.portals = portals
+        self.__requests = queue.Queue()
+        self.__request_id = 0
+
+        worker = threading.Thread(target=self.__worker, daemon=True)
+        worker.start()
+
+    def submit(
+        self,
+        start: position.Coordinate,
+        dest: position.Coordinate,
+        world: world.World,
+        on_found: Callable[[PathPlanner | None], None],
+    ) -> None:
+        """Plans path in the background and calls on_found with the result."""
+
+        def task(snapshot, is_cancelled):
+            return plan_path(start, dest, snapshot, self.navigation, is_cancelled)
+
+        self.__submit(task, world, on_found)
+
+    def submit_route(
+        self,
+        start: position.Coordinate,
+        dest: position.Coordinate,
+        world: world.World,
+        on_found: Callable[[list[position.Coordinate] | None], None],
+    ) -> None:
+        """
+        Plans chunk-level route (see plan_route()) in the background and calls
+        on_found with the result.
+        """
+
+        def task(snapshot, is_cancelled):
+            return plan_route(start, dest, snapshot, self.portals, is_cancelled)
+
+        self.__submit(task, world, on_found)
+
+    def __submit(self, task: Callable, world: world.World, on_found: Callable) -> None:
+        self.__request_id += 1
+        request = (self.__request_id, task, world.snapshot(), on_found)
+        self.__requests.put(request)
+
+    def cancel(self) -> None:
+        """Drops outstanding search, it's result will never be delivered."""
+        self.__request_id += 1
+
+    def __is_outdated(self, request_id: int) -> bool:
+        return request_id != self.__request_id
+
+    def __deliver(self, result: tuple) -> None:
+        request_id, found, on_found = result
+        if not self.__is_outdated(request_id):
+            on_found(found)
+
+    def __worker(self) -> None:
+        while 1:
+            request_id, task, snapshot, on_found = self.__requests.get()
+            if self.__is_outdated(request_id):
                 continue
 
-            for reachable_node in actually_reachable:
+            # Failed search is delivered as not found, so the player stops.
+            try:
+                found = task(snapshot, lambda: self.__is_outdated(request_id))
+            except Exception as error:
+                print(f"Path search failed: {error!r}")
+                found = None
 
-                # Save reachable nodes.
-                node.children.append(reachable_node)
+            if self.__is_outdated(request_id):
+                continue
 
-                if reachable_node.pos == self.dest:
-                    self.dest_nodes.append(reachable_node)
+            deliver_ev = events.CallEvent(
+                to_call=self.__deliver, args=[(request_id, found, on_found)]
+            )
+            events.main_loop.add_event(deliver_ev)
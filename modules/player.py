@@ -5,6 +5,7 @@ from modules import cooldown
 from modules import pathfind
 from modules import settings
 from modules import weather
+from modules import render
 from modules import events
 from modules import voxels
 from modules import world
@@ -48,6 +49,12 @@ class PreloadedTextures:
         self.shadow_full_img = pygame.image.load(
             "./res/texture/shadow/shadow_full.png"
         ).convert_alpha()
+        self.shadow_full_imgs = {}
+        for z_dist in range(1, world.SHADOW_FULL_RANGE + 1):
+            shadow_img = self.shadow_full_img.copy()
+            shadow_img.set_alpha(255 * ((10 - z_dist) / 10))
+            self.shadow_full_imgs[z_dist] = shadow_img
+
         self.shadow_left_img = pygame.image.load(
             "./res/texture/shadow/shadow_left.png"
         ).convert_alpha()
@@ -69,8 +76,8 @@ class PreloadedTextures:
         self.pf_dest = pygame.image.load("./res/texture/pfdest.png").convert_alpha()
 
         self.pick_block_ui = []
-        for voxel_type in voxels.ALL_VOXELS:
-            texture = voxel_type(position.Coordinate(-1, -1, -1)).texture
+        for voxel in voxels.ALL_VOXELS:
+            texture = voxel.textures[voxel.pick_variant()]
             self.pick_block_ui.append(texture)
 
 
@@ -84,14 +91,27 @@ class Player:
         self.chunk_load_anim = animation.ChunkChangeAnimation()
         self.preloaded_textures = PreloadedTextures()
         self.pick_block_index = 0
-        self.pathfinder = None
+        self.terrain_cache = render.TerrainCache(world, self.preloaded_textures)
+        self.navigation = pathfind.NavigationCache(world)
+        self.portals = pathfind.PortalCache(self.navigation)
+        self.pathfind_worker = pathfind.PathfindWorker(self.navigation, self.portals)
+        self.pathfind_dest: position.Coordinate | None = None
+        self.path_planner: pathfind.PathPlanner | None = None
+        self.route: list[position.Coordinate] = []
+        self.__travel_chunks: set[tuple[int, int]] = set()
+        self.__path_changes: set[tuple[int, int]] = set()
+        world.change_listeners.append(self.__on_world_change)
+        world.load_listeners.append(self.__on_chunk_load)
+        self.__clouds_frame = []
+        self.__last_frame_rects = None
+        self.__last_pick_index = self.pick_block_index
         self.render_x, self.render_y, self.rect = None, None, None
         self.__recalc_render_data()
         self.fall()
 
     def __recalc_render_data(self):
         z = self.pos.z
-        if isinstance(self.world.get_at_coord(self.pos), voxels.V_Water):
+        if self.world.get_id_at(self.pos.x, self.pos.y, self.pos.z) == voxels.WATER_ID:
             z -= 0.8
         
         self.render_x, self.render_y = calc.calc_tile_pos(
@@ -137,8 +157,8 @@ class Player:
             new_value = max_value - new_value + 1
         self.pick_block_index = new_value
 
-    def get_selected_block_class(self) -> voxels.Voxel:
-        """Returns base class of selected voxel."""
+    def get_selected_voxel(self) -> voxels.Voxel:
+        """Returns voxel type selected in the UI."""
         return voxels.ALL_VOXELS[self.pick_block_index]
 
     def get_texture(self) -> pygame.Surface:
@@ -147,77 +167,187 @@ class Player:
             return self.preloaded_textures.player_jump.get(self.facing)
         
         texture = self.preloaded_textures.player_idle.get(self.facing)
-        if isinstance(self.world.get_at_coord(self.pos), voxels.V_Water):
+        if self.world.get_id_at(self.pos.x, self.pos.y, self.pos.z) == voxels.WATER_ID:
             texture = texture.copy()
             texture.set_alpha(120)
         return texture
 
     def pathfind_move(self, destination: position.Coordinate) -> None:
         """
-        Move player to selected voxel using PathFinding algorithm.
-        This movement can be interrupted with manual move.
+        Move player to selected voxel using PathFinding algorithm. Path is
+        planned in the background and repaired after world's edits, this
+        movement can be interrupted with manual move or new pathfind move.
         """
-        self.pathfinder = None
-        events.move_loop.clear()
+        self.cancel_pathfind()
 
         if destination == self.pos:
-            self.pathfinder = None
             return
 
-        self.pathfinder = pathfind.PathFinder(self.pos, destination, self.world)
-        result_node = self.pathfinder.find()
+        self.pathfind_dest = self.world.to_world(destination)
+        self.pathfind_worker.submit(
+            self.pos, destination, self.world, self.__follow_path
+        )
 
-        if result_node is None:
-            self.pathfinder = None
+    def travel_to(self, destination: position.Coordinate) -> None:
+        """
+        Move player to world coordinate destination, possibly many chunks away.
+        Chunks on the way are requested in the background, once they are loaded
+        the route is planned over their portals (cell-level path is planned only
+        to the next chunk's border). Destination is moved to the nearest ground
+        of it's column. Travels needing more than MAX_LOADED_CHUNKS are refused.
+        """
+        self.cancel_pathfind()
+
+        start = self.world.to_world(self.pos)
+        if destination == start:
             return
 
-        moves = result_node.to_moves_sequence()
-        if not moves:
+        route_chunks = pathfind.get_route_chunks(start, destination)
+        if len(route_chunks) > settings.MAX_LOADED_CHUNKS:
+            print("Travel destination is too far...")
             return
 
-        wait = 0
-        for direction, movetype in moves:
-            wait += 1
-            exec_time = 0.2 * wait
-
-            if (
-                movetype == pathfind.PF_MoveType.WALK
-                or movetype == pathfind.PF_MoveType.FALL_WALK
-            ):
-                event = events.CallEvent(
-                    [lambda d: self.move(d)],
-                    events.in_n_seconds(exec_time),
-                    [direction],
-                )
+        self.pathfind_dest = destination
+        self.__travel_chunks = {
+            key for key in route_chunks if key not in self.world.chunks
+        }
+        for key in self.__travel_chunks:
+            self.world.request_chunk(key, 1)
+        if not self.__travel_chunks:
+            self.__start_travel()
+
+    def __start_travel(self) -> None:
+        """Plans route of travel when all chunks on the way are loaded."""
+        destination = self.world.to_relative(self.pathfind_dest)
+        grounds = self.world.reachable_grounds_at(destination.x, destination.y)
+        if not grounds:
+            self.pathfind_dest = None
+            return
 
-            if movetype == pathfind.PF_MoveType.FALL_WALK:
-                wait += 1
+        ground = min(grounds, key=lambda ground: abs(ground.z - destination.z))
+        self.pathfind_dest = self.world.to_world(ground)
+        self.pathfind_worker.submit_route(
+            self.world.to_world(self.pos),
+            self.pathfind_dest,
+            self.world,
+            self.__follow_route,
+        )
 
-            if movetype == pathfind.PF_MoveType.JUMP_WALK:
-                events.move_loop.add_event(
-                    events.CallEvent(
-                        [lambda: setattr(self, "pos", self.pos.add_z(2))],
-                        events.in_n_seconds(exec_time),
-                    )
-                )
-                event = events.CallEvent(
-                    [lambda d: self.move(d)],
-                    events.in_n_seconds(exec_time),
-                    [direction],
-                )
+    def cancel_pathfind(self) -> None:
+        """Stops planned or followed path."""
+        self.pathfind_worker.cancel()
+        self.pathfind_dest = None
+        self.path_planner = None
+        self.route = []
+        self.__travel_chunks = set()
+        self.__path_changes = set()
+        events.move_loop.clear()
 
-            events.move_loop.add_event(event)
+    def __on_world_change(self, chunk, coordinate: position.Coordinate) -> None:
+        """Collects world's columns which moves were changed by the edit."""
+        if self.pathfind_dest is None:
+            return
 
-        events.move_loop.add_event(
-            events.CallEvent(
-                [lambda: setattr(self, "pathfinder", None)],
-                events.in_n_seconds(exec_time),
-            )
-        )
+        x, y, _ = self.world.to_world(coordinate)
+        self.__path_changes.add((x, y))
+        for offset_x, offset_y in position.CROSS_OFFSETS.values():
+            self.__path_changes.add((x + offset_x, y + offset_y))
+
+    def __on_chunk_load(self, chunk) -> None:
+        """
+        Collects world's columns which moves were changed by loading chunk:
+        it's border columns and the ones bordering with it.
+        """
+        if self.pathfind_dest is None:
+            return
+
+        if (chunk.x, chunk.y) in self.__travel_chunks:
+            self.__travel_chunks.discard((chunk.x, chunk.y))
+            if not self.__travel_chunks:
+                self.__start_travel()
+
+        size = settings.CHUNK_SIZE
+        origin_x, origin_y = chunk.x * size, -chunk.y * size
+        for i in range(-1, size + 1):
+            for border in (-1, 0, size - 1, size):
+                self.__path_changes.add((origin_x + i, origin_y + border))
+                self.__path_changes.add((origin_x + border, origin_y + i))
+
+    def __follow_route(self, route: list[position.Coordinate] | None) -> None:
+        if route is None:
+            self.pathfind_dest = None
+            return
+
+        self.route = route
+        self.__next_leg()
+
+    def __next_leg(self) -> None:
+        """Plans path to the next waypoint of followed route."""
+        waypoint = self.world.to_relative(self.route.pop(0))
+        self.pathfind_worker.submit(self.pos, waypoint, self.world, self.__follow_path)
+
+    def __follow_path(self, planner: pathfind.PathPlanner | None) -> None:
+        if planner is None:
+            self.pathfind_dest = None
+            self.route = []
+            return
+
+        # Planned on world's snapshot, from now on repaired on the world itself.
+        planner.queries = self.world
+        planner.is_cancelled = None
+        self.path_planner = planner
+        if not self.route:
+            self.pathfind_dest = planner.dest
+
+        step_ev = events.CallEvent(self.__path_step, events.in_n_seconds(0.2))
+        events.move_loop.add_event(step_ev)
+
+    def __path_step(self) -> None:
+        """Makes the next move of followed path."""
+        planner = self.path_planner
+        if planner is None:
+            return
+
+        if self.__path_changes:
+            planner.update_columns(self.__path_changes)
+            self.__path_changes = set()
+        planner.move_start(self.world.to_world(self.pos))
+
+        # Repair after a large edit is spread over frames.
+        if not planner.compute(settings.PATH_REPAIR_EXPANSIONS):
+            step_ev = events.CallEvent(self.__path_step, events.in_n_seconds(0))
+            events.move_loop.add_event(step_ev)
+            return
+
+        move = planner.next_move()
+        if move is None:
+            self.__end_path()
+            return
+
+        _, direction, movetype = move
+        if movetype == pathfind.PF_MoveType.JUMP_WALK:
+            self.pos = self.pos.add_z(2)
+        self.move(direction)
+
+        if self.world.to_world(self.pos) == planner.dest:
+            self.__end_path()
+            return
+
+        wait = 0.4 if movetype == pathfind.PF_MoveType.FALL_WALK else 0.2
+        step_ev = events.CallEvent(self.__path_step, events.in_n_seconds(wait))
+        events.move_loop.add_event(step_ev)
+
+    def __end_path(self) -> None:
+        """Ends followed path, continues with the next leg of route if any."""
+        self.path_planner = None
+        if self.route:
+            self.__next_leg()
+        else:
+            self.pathfind_dest = None
 
     def fall(self) -> None:
         """Fall to the nearest ground."""
-        if self.pathfinder is not None:
+        if self.pathfind_dest is not None:
             self.instant_fall()
             return
 
@@ -260,65 +390,42 @@ class Player:
     def move(self, direction: position.AngleDirection, manual: bool = False) -> None:
         """Moves player in chosen direction."""
         if manual:
-            self.pathfinder = None
-            events.move_loop.clear()
+            self.cancel_pathfind()
 
         self.facing = direction
 
-        if direction == position.AngleDirection.N:
-            new_pos = self.pos.add_y(-1)
-        if direction == position.AngleDirection.S:
-            new_pos = self.pos.add_y(1)
-        if direction == position.AngleDirection.E:
-            new_pos = self.pos.add_x(1)
-        if direction == position.AngleDirection.W:
-            new_pos = self.pos.add_x(-1)
-
-        face_level_coord = new_pos.add_z(2)
-        if self.world.get_at_coord(face_level_coord) is not None:
+        offset_x, offset_y = position.CROSS_OFFSETS[direction]
+        new_pos = self.pos.offset(offset_x, offset_y)
+
+        # Chunk is still being generated, wait for it.
+        if not self.world.is_loaded_at(new_pos.x, new_pos.y):
+            self.world.request_chunk(self.world.chunk_key_at(new_pos.x, new_pos.y))
+            return
+
+        # Checks reach into bounding chunks, so the move is the same on borders.
+        if self.world.is_solid(new_pos.x, new_pos.y, new_pos.z + 2):
             return
 
         nearest_higher_z = self.world.nearest_higher_at(new_pos.x, new_pos.y, new_pos.z)
         if nearest_higher_z == new_pos.z + 1:
-            face_level_coord = new_pos.add_z(3)
-            if self.world.get_at_coord(face_level_coord) is not None:
+            if self.world.is_solid(new_pos.x, new_pos.y, new_pos.z + 3):
                 return
-            if self.world.get_at_coord(self.pos.add_z(3)) is not None:
+            if self.world.is_solid(self.pos.x, self.pos.y, self.pos.z + 3):
                 return
             new_pos = new_pos.add_z(1)
 
         # Change chunks
-        if new_pos.x >= settings.CHUNK_SIZE:
-            new_pos.x = new_pos.x - settings.CHUNK_SIZE
-            self.world.update_current_chunk(1, 0)
-            self.chunk_load_anim.reset(new_pos)
-            if self.world.get_at_coord(new_pos) is not None:
-                new_pos.z = self.world.highest_at(new_pos.x, new_pos.y) + 1
-            self.pos = new_pos
-
-        if new_pos.x < 0:
-            new_pos.x = settings.CHUNK_SIZE - 1
-            self.world.update_current_chunk(-1, 0)
-            self.chunk_load_anim.reset(new_pos)
-            if self.world.get_at_coord(new_pos) is not None:
-                new_pos.z = self.world.highest_at(new_pos.x, new_pos.y) + 1
-            self.pos = new_pos
-
-        if new_pos.y >= settings.CHUNK_SIZE:
-            new_pos.y = new_pos.y - settings.CHUNK_SIZE
-            self.world.update_current_chunk(0, -1)
+        change_x = new_pos.x // settings.CHUNK_SIZE
+        change_y = -(new_pos.y // settings.CHUNK_SIZE)
+        if change_x or change_y:
+            new_pos = new_pos._replace(
+                x=new_pos.x % settings.CHUNK_SIZE, y=new_pos.y % settings.CHUNK_SIZE
+            )
+            self.world.update_current_chunk(change_x, change_y)
             self.chunk_load_anim.reset(new_pos)
-            if self.world.get_at_coord(new_pos) is not None:
-                new_pos.z = self.world.highest_at(new_pos.x, new_pos.y) + 1
             self.pos = new_pos
 
-        if new_pos.y < 0:
-            new_pos.y = settings.CHUNK_SIZE - 1
-            self.world.update_current_chunk(0, 1)
-            self.chunk_load_anim.reset(new_pos)
-            if self.world.get_at_coord(new_pos) is not None:
-                new_pos.z = self.world.highest_at(new_pos.x, new_pos.y) + 1
-            self.pos = new_pos
+        self.world.prefetcher.on_move(new_pos, direction)
 
         # Fall.
         new_ground_block = self.world.get_at_coord(new_pos)
@@ -328,177 +435,231 @@ class Player:
             return
 
         if new_ground_block:
-            new_ground_block.on_stand(new_pos, self)
+            new_ground_block.voxel.on_stand(new_pos, self)
 
         self.pos = new_pos
         self.__recalc_render_data()
 
-    def render(self):
-        """Render entire scene."""
-        mx, my = pygame.mouse.get_pos()
-        self.screen.blit(self.preloaded_textures.background_img, (0, 0))
-        player_texture_intersection_rect = pygame.Rect(
+    def get_ghosted_rects(self) -> list[pygame.Rect]:
+        """Rects of blocks between player and camera (rendered as less visible)."""
+        ghost_area = self.__get_ghost_area()
+        return [
+            voxels.get_rect(x, y, z)
+            for x, y, z, block_id, _, _ in render.iter_cells(
+                self.world.current_chunk, ghost_area
+            )
+            if self.__is_ghosted(x, y, z, block_id, ghost_area)
+        ]
+
+    def __get_ghost_area(self) -> pygame.Rect:
+        return pygame.Rect(
             self.rect.x, self.rect.y, self.rect.width, self.rect.height // 2
         )
-        player_drawed = False
 
-        # Highlighted block.
-        h_block = None
-        if mx is not None and my is not None:
-            h_block = self.world.get_highlighted_block(mx, my)
+    def __is_ghosted(
+        self, x: int, y: int, z: int, block_id: int, ghost_area: pygame.Rect
+    ) -> bool:
+        return (
+            (self.pos.x < x or self.pos.y < y)
+            and self.pos.z < z
+            and block_id not in voxels.SKIP_ON_VISIBLITY_CHECK_IDS
+            and voxels.get_rect(x, y, z).colliderect(ghost_area)
+        )
+
+    def get_dynamic_rects(self, h_block: world.HighlightedItem | None) -> list[pygame.Rect]:
+        """Screen rects of everything drawn over the cached terrain."""
+        rects = [self.rect, *self.get_ghosted_rects()]
+        rects.extend(particle.rect for particle in particles.active_particles)
+        if h_block:
+            rects.append(h_block.block.rect)
+        if self.pathfind_dest is not None:
+            dest = self.world.to_relative(self.pathfind_dest)
+            rects.append(voxels.get_rect(dest.x, dest.y, dest.z))
+        return calc.merge_rects(rects)
+
+    def __get_clouds_frame(self) -> list[tuple[pygame.Surface, pygame.Rect]]:
+        """Snapshot of on-screen clouds (clouds are moved by weather thread)."""
+        screen_rect = self.screen.get_rect()
+        clouds = []
+        for cloud in list(weather.render_clouds):
+            rect = cloud.texture.get_rect().move(cloud.screen_x, cloud.screen_y)
+            if rect.colliderect(screen_rect):
+                clouds.append((cloud.texture, rect))
+        return clouds
+
+    def __render_clouds(self) -> None:
+        for texture, rect in self.__clouds_frame:
+            self.screen.blit(texture, rect)
+
+    def __render_ui(self) -> None:
+        for offset_x, block_texture in enumerate(self.preloaded_textures.pick_block_ui):
+            rect = block_texture.get_rect().move((offset_x + 3.5) * 80, 20)
+            self.screen.blit(block_texture, rect)
+            if offset_x == self.pick_block_index:
+                outline = calc.get_outline(block_texture, calc.PICK_OUTLINE_COLOR)
+                self.screen.blit(outline, rect)
 
-        # Clouds.
-        for cloud in weather.render_clouds:
-            rect = cloud.texture.get_rect()
-            if rect.left < settings.SCREEN_WIDTH or rect.right > 0:
-                self.screen.blit(cloud.texture, (cloud.screen_x, cloud.screen_y))
+    def get_ui_rect(self) -> pygame.Rect:
+        """Screen rect of the pick block UI bar."""
+        rects = [
+            block_texture.get_rect().move((offset_x + 3.5) * 80, 20)
+            for offset_x, block_texture in enumerate(self.preloaded_textures.pick_block_ui)
+        ]
+        return rects[0].unionall(rects[1:])
+
+    def __render_cells(
+        self, region: pygame.Rect | None, h_block: world.HighlightedItem | None
+    ) -> None:
+        """Render world's cells with all dynamic items in region (None for all)."""
+        ghost_area = self.__get_ghost_area()
+        player_drawed = False
+        particles_at = particles.group_by_position()
+        pf_dest = None
+        if self.pathfind_dest is not None:
+            pf_dest = self.world.to_relative(self.pathfind_dest)
+
+        # X bitmasks of non-block items (player, particles) for each (z, y) row.
+        items_rows = {}
+        for item_x, item_y, item_z in (self.pos, *particles_at):
+            if settings.CHUNK_SIZE > item_x >= 0 and settings.CHUNK_SIZE > item_y >= 0:
+                row_key = (item_z, item_y)
+                items_rows[row_key] = items_rows.get(row_key, 0) | 1 << item_x
+
+        for x, y, z, block_id, variant, shadow in render.iter_cells(
+            self.world.current_chunk, region, items_rows
+        ):
+            coordinate = position.Coordinate(x, y, z)
+
+            # Particles.
+            for particle in particles_at.get(coordinate, ()):
+                self.screen.blit(
+                    particle.texture,
+                    self.chunk_load_anim.update_rect(x, y, particle.rect),
+                )
 
-        # World.
-        for z, z_row in enumerate(self.world.current_chunk.voxels):
-            if z in self.world.current_chunk.skip_heights and self.pos.z != z:
+            if block_id == voxels.EMPTY_ID:
+                if coordinate == self.pos:
+                    self.screen.blit(self.get_texture(), self.rect)
+                    player_drawed = True
                 continue
 
-            for y, row in enumerate(z_row):
-                if calc.is_all_none(row) and self.pos.y != y:
-                    continue
-
-                for x, block in enumerate(row):
-                    coordinate = position.Coordinate(x, y, z)
-
-                    if block and not self.world.is_visible(block.coordinate):
-                        continue
-
-                    # Particles.
-                    for particle in particles.active_particles:
-                        if particle.pos == coordinate:
-                            self.screen.blit(
-                                particle.texture,
-                                self.chunk_load_anim.update_rect(x, y, particle.rect),
-                            )
-
-                    if block is None:
-                        if coordinate == self.pos:
-                            self.screen.blit(self.get_texture(), self.rect)
-                            player_drawed = True
-                        continue
-
-                    # Texture.
-                    if (
-                        (self.pos.x < x or self.pos.y < y)
-                        and self.pos.z < z
-                        and block.rect.colliderect(player_texture_intersection_rect)
-                        and block.__class__ not in voxels.SKIP_ON_VISIBLITY_CHECK
-                    ):
-                        block.texture.set_alpha(80)
-                        self.screen.blit(
-                            calc.get_outline(block.texture, (255, 255, 255, 80)),
-                            self.chunk_load_anim.update_rect(x, y, block.rect),
-                        )
-
-                    self.screen.blit(
-                        block.texture,
-                        self.chunk_load_anim.update_rect(x, y, block.rect),
-                    )
-
-                    if self.pos.z == z - 1 and (
-                        x + 1 == self.pos.x or y + 1 == self.pos.y
-                    ):
-                        if block.rect.colliderect(self.rect):
-                            inter = calc.rects_intersection(block.rect, self.rect)
-                            chopped = pygame.transform.chop(
-                                self.get_texture(), inter
-                            ).convert_alpha()
-                            self.screen.blit(chopped, self.rect)
-
-                    block.texture.set_alpha(255)
-
-                    # Shading.
-                    is_block_above = (
-                        self.world.get_at_coord(block.coordinate.add_z(1)) is not None
-                    )
-                    left_coord = block.coordinate.add_z(1).add_x(-1)
-                    right_coord = block.coordinate.add_z(1).add_y(-1)
-                    corner_coord = block.coordinate.add_z(1).add_x(-1).add_y(-1)
-
-                    if not is_block_above:
-                        # - Side shadows.
-                        if self.world.get_at_coord(left_coord) is not None:
-                            self.screen.blit(
-                                self.preloaded_textures.shadow_left_img,
-                                self.chunk_load_anim.update_rect(x, y, block.rect),
-                            )
-
-                        if self.world.get_at_coord(right_coord) is not None:
-                            self.screen.blit(
-                                self.preloaded_textures.shadow_right_img,
-                                self.chunk_load_anim.update_rect(x, y, block.rect),
-                            )
-
-                        if self.world.get_at_coord(corner_coord) is not None:
-                            self.screen.blit(
-                                self.preloaded_textures.shadow_corner_img,
-                                self.chunk_load_anim.update_rect(x, y, block.rect),
-                            )
-
-                        # - Full shadow.
-                        z_dist = (
-                            self.world.nearest_higher_at(
-                                block.coordinate.x,
-                                block.coordinate.y,
-                                block.coordinate.z,
-                            )
-                            - block.coordinate.z
-                        )
-                        if z_dist in range(1, 11):
-                            self.preloaded_textures.shadow_full_img.set_alpha(
-                                255 * ((10 - z_dist) / 10)
-                            )
-                            self.screen.blit(
-                                self.preloaded_textures.shadow_full_img,
-                                self.chunk_load_anim.update_rect(x, y, block.rect),
-                            )
-
-                    # Player.
-                    if coordinate == self.pos:
-                        self.screen.blit(self.get_texture(), self.rect)
-                        player_drawed = True
-
-                    # Pathfind destination.
-                    if self.pathfinder and coordinate == self.pathfinder.dest:
-                        self.screen.blit(
-                            self.preloaded_textures.pf_dest,
-                            self.chunk_load_anim.update_rect(x, y, block.rect),
-                        )
-
-                    # Highlight.
-                    if (
-                        h_block
-                        and h_block.block.coordinate.z == z
-                        and h_block.block.coordinate.y == y
-                        and h_block.block.coordinate.x == x
-                    ):
-                        outline_texture = calc.get_outline(h_block.block.texture)
-                        self.screen.blit(
-                            outline_texture,
-                            self.chunk_load_anim.update_rect(x, y, block.rect),
-                        )
-                        if not isinstance(
-                            h_block.block, voxels.SKIP_ON_VISIBLITY_CHECK
-                        ):
-                            self.screen.blit(
-                                self.preloaded_textures.highlight_img,
-                                self.chunk_load_anim.update_rect(x, y, block.rect),
-                            )
+            texture = voxels.ID_VOXELS[block_id].textures[variant]
+            block_rect = voxels.get_rect(x, y, z)
+            anim_rect = self.chunk_load_anim.update_rect(x, y, block_rect)
+
+            # Texture.
+            if self.__is_ghosted(x, y, z, block_id, ghost_area):
+                texture.set_alpha(80)
+                self.screen.blit(
+                    calc.get_outline(texture, calc.GHOST_OUTLINE_COLOR), anim_rect
+                )
+
+            self.screen.blit(texture, anim_rect)
+
+            if self.pos.z == z - 1 and (x + 1 == self.pos.x or y + 1 == self.pos.y):
+                if block_rect.colliderect(self.rect):
+                    inter = calc.rects_intersection(block_rect, self.rect)
+                    chopped = pygame.transform.chop(
+                        self.get_texture(), inter
+                    ).convert_alpha()
+                    self.screen.blit(chopped, self.rect)
+
+            texture.set_alpha(255)
+
+            # Shading.
+            render.draw_shadows(self.screen, self.preloaded_textures, shadow, anim_rect)
+
+            # Player.
+            if coordinate == self.pos:
+                self.screen.blit(self.get_texture(), self.rect)
+                player_drawed = True
+
+            # Pathfind destination.
+            if coordinate == pf_dest:
+                self.screen.blit(self.preloaded_textures.pf_dest, anim_rect)
+
+            # Highlight.
+            if h_block and h_block.block.coordinate == coordinate:
+                outline_texture = calc.get_outline(h_block.block.texture)
+                self.screen.blit(outline_texture, anim_rect)
+                if h_block.block.voxel not in voxels.SKIP_ON_VISIBLITY_CHECK:
+                    self.screen.blit(self.preloaded_textures.highlight_img, anim_rect)
 
         if not player_drawed:
             self.screen.blit(self.get_texture(), self.rect)
 
-        # UI.
-        for offset_x, block_texture in enumerate(self.preloaded_textures.pick_block_ui):
-            rect = block_texture.get_rect().move((offset_x + 3.5) * 80, 20)
-            self.screen.blit(block_texture, rect)
-            if offset_x == self.pick_block_index:
-                outline = calc.get_outline(block_texture, (250, 50, 50))
-                self.screen.blit(outline, rect)
+    def render(self):
+        """Render entire scene."""
+        mx, my = pygame.mouse.get_pos()
+        background = self.preloaded_textures.background_img
+        self.__clouds_frame = self.__get_clouds_frame()
+        clouds_rects = [rect for _, rect in self.__clouds_frame]
+
+        # Highlighted block.
+        h_block = None
+        if mx is not None and my is not None:
+            h_block = self.world.get_highlighted_block(mx, my)
+
+        # During chunk change animation every block has it's own offset, so the
+        # entire scene is drawn from scratch.
+        if self.chunk_load_anim.is_running():
+            self.screen.blit(background, (0, 0))
+            self.__render_clouds()
+            self.__render_cells(None, h_block)
+            self.__render_ui()
+            pygame.display.flip()
+            self.__last_frame_rects = None
+            return
 
-        pygame.display.flip()
+        # Otherwise base layer (background, clouds and cached terrain) is only
+        # recomposed where something changed since the last frame and regions
+        # of dynamic items are redrawn on top of it.
+        redrawn_terrain = self.terrain_cache.update()
+        full_update = (
+            not settings.DIRTY_RECT_UPDATES
+            or self.__last_frame_rects is None
+            or None in redrawn_terrain
+        )
+
+        ui_rect = self.get_ui_rect()
+        dynamic_rects = self.get_dynamic_rects(h_block)
+        if full_update:
+            base_rects = [self.screen.get_rect()]
+        else:
+            base_rects = [*redrawn_terrain, *self.__last_frame_rects, *clouds_rects]
+            if self.pick_block_index != self.__last_pick_index:
+                base_rects.append(ui_rect)
+            base_rects = calc.merge_rects(base_rects)
+
+        # UI is redrawn over entirely recomposed area, so it's semi-transparent
+        # pixels are never blended twice.
+        ui_changed = (
+            ui_rect.collidelist(base_rects) != -1
+            or ui_rect.collidelist(dynamic_rects) != -1
+        )
+        if ui_changed:
+            base_rects = calc.merge_rects([*base_rects, ui_rect])
+
+        for region in base_rects:
+            self.screen.set_clip(region)
+            self.screen.blit(background, region, region)
+            self.__render_clouds()
+            self.screen.blit(self.terrain_cache.surface, region, region)
+
+        for region in dynamic_rects:
+            self.screen.set_clip(region)
+            self.screen.blit(background, region, region)
+            self.__render_clouds()
+            self.__render_cells(region, h_block)
+        self.screen.set_clip(None)
+
+        if ui_changed:
+            self.__render_ui()
+
+        if full_update:
+            pygame.display.flip()
+        else:
+            pygame.display.update(calc.merge_rects([*base_rects, *dynamic_rects]))
+
+        self.__last_frame_rects = [*dynamic_rects, *clouds_rects]
+        self.__last_pick_index = self.pick_block_index
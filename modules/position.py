@@ -1,15 +1,34 @@
-from dataclasses import dataclass
+from typing import NamedTuple
 
 
-@dataclass
-class Coordinate:
+# Packed integer keys layout: | X (24 bits) | Y (24 bits) | Z (8 bits) |
+XY_KEY_BITS = 24
+XY_KEY_OFFSET = 1 << (XY_KEY_BITS - 1)
+Z_KEY_BITS = 8
+
+
+def pack(x: int, y: int, z: int) -> int:
+    """Packs (X, Y, Z) into single integer key. (X/Y may be negative)"""
+    return ((x + XY_KEY_OFFSET) << (XY_KEY_BITS + Z_KEY_BITS)) | (
+        (y + XY_KEY_OFFSET) << Z_KEY_BITS
+    ) | z
+
+
+def unpack(key: int) -> "Coordinate":
+    """Reverts pack() into Coordinate."""
+    z = key & ((1 << Z_KEY_BITS) - 1)
+    y = ((key >> Z_KEY_BITS) & ((1 << XY_KEY_BITS) - 1)) - XY_KEY_OFFSET
+    x = (key >> (XY_KEY_BITS + Z_KEY_BITS)) - XY_KEY_OFFSET
+    return Coordinate(x, y, z)
+
+
+class Coordinate(NamedTuple):
+    """Immutable (X, Y, Z) position. Hashed and compared as a plain tuple."""
+
     x: int
     y: int
     z: int
 
-    def __hash__(self) -> int:
-        return hash(f"{self.x}.{self.y}.{self.z}")
-
     def add_x(self, x_: int) -> "Coordinate":
         return Coordinate(self.x + x_, self.y, self.z)
 
@@ -19,12 +38,33 @@ class Coordinate:
     def add_z(self, z_: int) -> "Coordinate":
         return Coordinate(self.x, self.y, self.z + z_)
 
+    def offset(self, x_: int = 0, y_: int = 0, z_: int = 0) -> "Coordinate":
+        """Moves by all axes at once (without intermediate Coordinates)."""
+        return Coordinate(self.x + x_, self.y + y_, self.z + z_)
+
+    def with_z(self, z: int) -> "Coordinate":
+        return Coordinate(self.x, self.y, z)
+
+    def key(self) -> int:
+        """Packed integer key for dict/set usage."""
+        return pack(self.x, self.y, self.z)
+
     def get_sum(self) -> int:
         return self.x + self.y + self.z
 
     def as_tuple(self) -> tuple[int, int, int]:
         return (self.x, self.y, self.z)
 
+    def as_str(self) -> str:
+        """Text key used by save file. (X.Y.Z)"""
+        return f"{self.x}.{self.y}.{self.z}"
+
+    @staticmethod
+    def from_str(text: str) -> "Coordinate":
+        """Reverts as_str()."""
+        x, y, z = text.split(".")
+        return Coordinate(int(x), int(y), int(z))
+
 
 class BlockFace:
     NONE  = -1
@@ -44,6 +84,15 @@ class AngleDirection:
     NW = 315
 
 
+# (X, Y) offsets of cross neighbours.
+CROSS_OFFSETS = {
+    AngleDirection.N: (0, -1),
+    AngleDirection.E: (1, 0),
+    AngleDirection.S: (0, 1),
+    AngleDirection.W: (-1, 0),
+}
+
+
 NORTHISH = {AngleDirection.N, AngleDirection.NE, AngleDirection.NW}
 SOUTHISH = {AngleDirection.S, AngleDirection.SE, AngleDirection.SW}
 EASTISH  = {AngleDirection.E, AngleDirection.NE, AngleDirection.SE}
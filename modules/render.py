@@ -0,0 +1,151 @@
+"""Chunk's cells iteration by screen regions and cached static terrain layer."""
+
+from modules import position
+from modules import settings
+from modules import voxels
+from modules import world
+from modules import calc
+
+from typing import Iterator
+import pygame
+
+
+FULL_ROW_MASK = (1 << settings.CHUNK_SIZE) - 1
+
+
+def region_rows_masks(region: pygame.Rect | None, z: int) -> list[int]:
+    """X bitmask of tiles overlapping region for every Y row at Z level."""
+    if region is None:
+        return [FULL_ROW_MASK] * settings.CHUNK_SIZE
+
+    u_range, v_range = calc.tiles_in_rect(region, z)
+    masks = []
+    for y in range(settings.CHUNK_SIZE):
+        lowest = max(0, u_range.start + y, v_range.start - y)
+        highest = min(settings.CHUNK_SIZE - 1, u_range.stop - 1 + y, v_range.stop - 1 - y)
+        if lowest > highest:
+            masks.append(0)
+            continue
+        masks.append((1 << (highest + 1)) - (1 << lowest))
+    return masks
+
+
+def iter_cells(
+    chunk,
+    region: pygame.Rect | None = None,
+    items_rows: dict[tuple[int, int], int] | None = None,
+) -> Iterator[tuple[int, int, int, int, int, int]]:
+    """
+    Yields (x, y, z, block_id, variant, shadow) of chunk's visible blocks in the drawing
+    order. Cells marked in items_rows ((z, y): X bitmask) are yielded even if
+    empty. Only cells overlapping region are yielded (all if region is None).
+    """
+    items_rows = items_rows or {}
+    items_layers = {z for z, _ in items_rows}
+
+    for z in range(settings.CHUNK_MAX_HEIGHT):
+        if chunk.is_layer_empty(z) and z not in items_layers:
+            continue
+
+        visible_rows = chunk.visible_rows[z]
+        region_masks = region_rows_masks(region, z)
+        for y in range(chunk.size):
+            row_mask = visible_rows[y] | items_rows.get((z, y), 0)
+            row_mask &= region_masks[y]
+            if not row_mask:
+                continue
+
+            blocks_row = chunk.blocks[z, y].tolist()
+            variants_row = chunk.variants[z, y].tolist()
+            shadows_row = chunk.shadows[z, y].tolist()
+
+            # Lowest X first.
+            while row_mask:
+                lowest_bit = row_mask & -row_mask
+                row_mask ^= lowest_bit
+                x = lowest_bit.bit_length() - 1
+                yield x, y, z, blocks_row[x], variants_row[x], shadows_row[x]
+
+
+def get_edit_region(coordinate: position.Coordinate) -> pygame.Rect:
+    """
+    Screen region that may change after editing block at coordinate: the
+    block itself, blocks it covers or shades and the column below it.
+    """
+    x, y, z = coordinate
+    corners = [
+        voxels.get_rect(x + offset_x, y + offset_y, tile_z)
+        for offset_x in (-1, 1)
+        for offset_y in (-1, 1)
+        for tile_z in (0, z + 1)
+    ]
+    return corners[0].unionall(corners[1:])
+
+
+def draw_shadows(
+    surface: pygame.Surface, textures, shadow: int, rect: pygame.Rect
+) -> None:
+    """Draws shadows described by chunk's shadow code on the top of block."""
+    if shadow & world.SHADOW_LEFT:
+        surface.blit(textures.shadow_left_img, rect)
+
+    if shadow & world.SHADOW_RIGHT:
+        surface.blit(textures.shadow_right_img, rect)
+
+    if shadow & world.SHADOW_CORNER:
+        surface.blit(textures.shadow_corner_img, rect)
+
+    z_dist = shadow >> world.SHADOW_FULL_SHIFT
+    if z_dist:
+        surface.blit(textures.shadow_full_imgs[z_dist], rect)
+
+
+class TerrainCache:
+    """
+    Static part of current chunk (blocks and their shadows) pre-rendered into
+    an offscreen surface. After world's edits only changed regions are redrawn.
+    """
+
+    def __init__(self, world, textures) -> None:
+        self.world = world
+        self.textures = textures
+        self.surface = pygame.Surface(
+            (settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT), pygame.SRCALPHA
+        )
+        self.chunk = None
+        self.dirty_regions: list[pygame.Rect] = []
+
+        world.change_listeners.append(self.invalidate_at)
+
+    def invalidate_at(self, chunk, coordinate: position.Coordinate) -> None:
+        """Marks region changed by edit at chunk's coordinate to be redrawn."""
+        if chunk is self.chunk:
+            self.dirty_regions.append(get_edit_region(coordinate))
+
+    def update(self) -> list[pygame.Rect | None]:
+        """
+        Redraws outdated parts of the cache. Returns redrawn regions
+        (None stands for entire surface).
+        """
+        if self.chunk is not self.world.current_chunk:
+            self.chunk = self.world.current_chunk
+            self.dirty_regions = []
+            self.__redraw(None)
+            return [None]
+
+        redrawn = calc.merge_rects(self.dirty_regions)
+        self.dirty_regions = []
+        for region in redrawn:
+            self.__redraw(region)
+        return redrawn
+
+    def __redraw(self, region: pygame.Rect | None) -> None:
+        self.surface.set_clip(region)
+        self.surface.fill((0, 0, 0, 0))
+
+        for x, y, z, block_id, variant, shadow in iter_cells(self.chunk, region):
+            rect = voxels.get_rect(x, y, z)
+            self.surface.blit(voxels.ID_VOXELS[block_id].textures[variant], rect)
+            draw_shadows(self.surface, self.textures, shadow, rect)
+
+        self.surface.set_clip(None)
@@ -1,104 +1,312 @@
-"""Manages world's save file. All actions are canceled if AVOID_SAVE setting is on."""
+"""
+Manages world's save. Changes are stored as chunks' differences in binary region
+files, so saving a change rewrites only it's chunk's record. All actions are
+canceled if AVOID_SAVE setting is on.
+"""
 
 from modules import settings
 from modules import position
+from modules import blocks
 
+import numpy as np
+import threading
+import shutil
 import json
 import os
 
 
-SAVE_FILE = "./save.json"
+SAVE_DIR = "./save/"
+LEVEL_FILE = SAVE_DIR + "level.json"
+LEGACY_SAVE_FILE = "./save.json"
+
+REGION_SIZE = 16
+"""Chunks are grouped into regions of REGION_SIZE x REGION_SIZE, one file each."""
+
+# Region file starts with an offset table of it's chunks' records, followed by
+# the records. Record is an array of changed cells: packed position and block
+# ID (index in level's blocks palette, EMPTY_ID for removed block).
+TABLE_ENTRY_DTYPE = np.dtype(
+    [("offset", "<u4"), ("length", "<u4"), ("capacity", "<u4")]
+)
+RECORD_DTYPE = np.dtype([("pos", "<u2"), ("id", "u1")])
+TABLE_SIZE = REGION_SIZE * REGION_SIZE * TABLE_ENTRY_DTYPE.itemsize
+MIN_RECORD_CAPACITY = 16 * RECORD_DTYPE.itemsize
+
+
+def pack_pos(x: int, y: int, z: int) -> int:
+    """Packs position inside chunk into a single number."""
+    return (z * settings.CHUNK_SIZE + y) * settings.CHUNK_SIZE + x
+
+
+def unpack_pos(packed: int) -> position.Coordinate:
+    """Reverts pack_pos()."""
+    packed, x = divmod(packed, settings.CHUNK_SIZE)
+    z, y = divmod(packed, settings.CHUNK_SIZE)
+    return position.Coordinate(x, y, z)
+
+
+class RegionFile:
+    """Region's file. Offset table is kept in memory, records are read on demand."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = None
+        self.table = np.zeros(REGION_SIZE * REGION_SIZE, dtype=TABLE_ENTRY_DTYPE)
+
+        if os.path.exists(path):
+            self.file = open(path, "r+b")
+            header = self.file.read(TABLE_SIZE)
+            if len(header) == TABLE_SIZE:
+                self.table = np.frombuffer(header, dtype=TABLE_ENTRY_DTYPE).copy()
+            else:
+                self.file.truncate(0)
+                self.file.write(self.table.tobytes())
+
+    def has_record(self, index: int) -> bool:
+        return bool(self.table["length"][index])
+
+    def read_record(self, index: int) -> bytes:
+        length = int(self.table["length"][index])
+        if self.file is None or not length:
+            return b""
+
+        self.file.seek(int(self.table["offset"][index]))
+        return self.file.read(length)
+
+    def write_record(self, index: int, data: bytes) -> None:
+        """
+        Overwrites record in place. Record that outgrew it's space is moved to the
+        end of file with twice the space it needs.
+        """
+        if self.file is None:
+            self.file = open(self.path, "w+b")
+            self.file.write(self.table.tobytes())
+
+        entry = self.table[index : index + 1]
+        entry["length"] = len(data)
+        if len(data) > entry["capacity"][0]:
+            entry["offset"] = self.file.seek(0, os.SEEK_END)
+            entry["capacity"] = max(MIN_RECORD_CAPACITY, 2 * len(data))
+            data = data.ljust(int(entry["capacity"][0]), b"\0")
+
+        self.file.seek(int(entry["offset"][0]))
+        self.file.write(data)
+        self.file.seek(index * TABLE_ENTRY_DTYPE.itemsize)
+        self.file.write(entry.tobytes())
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+level = {}
+palette: list[str | None] = [None]
+"""Block type name of each block ID used by the save (None for EMPTY_ID)."""
+
+regions: dict[tuple[int, int], RegionFile] = {}
+diffs: dict[tuple[int, int], dict[int, int]] = {}
+"""Cached chunks' differences: block ID at packed position."""
+
+# Chunks are read by the chunk loading threads.
+lock = threading.Lock()
 
 
 def get_saved_seed() -> int | None:
-    if not os.path.exists(SAVE_FILE):
+    if os.path.exists(LEVEL_FILE):
+        content = read_json(LEVEL_FILE)
+    elif os.path.exists(LEGACY_SAVE_FILE):
+        content = read_json(LEGACY_SAVE_FILE)
+    else:
         return None
-    content = read_content()
+
     if not content:
         return None
     return content["seed"]
 
 
-def create_file():
+def create_save():
     if settings.AVOID_SAVE:
         return
-    if not os.path.exists(SAVE_FILE):
-        with open(SAVE_FILE, "a+") as file:
-            data = {"seed": settings.SEED, "chunks": {}}
-            json.dump(data, file)
+    if not os.path.exists(LEVEL_FILE):
+        os.makedirs(SAVE_DIR, exist_ok=True)
+        write_level({"seed": settings.SEED, "blocks": list(blocks.BLOCK_IDS)})
 
 
 def remove_save():
-    if os.path.exists(SAVE_FILE):
-        os.remove(SAVE_FILE)
+    close_regions()
+    if os.path.exists(SAVE_DIR):
+        shutil.rmtree(SAVE_DIR)
+    if os.path.exists(LEGACY_SAVE_FILE):
+        os.remove(LEGACY_SAVE_FILE)
 
 
-def read_content() -> str | bool:
-    with open(SAVE_FILE) as file:
+def close_regions() -> None:
+    with lock:
+        for region in regions.values():
+            region.close()
+        regions.clear()
+        diffs.clear()
+
+
+def read_json(path: str) -> dict | bool:
+    with open(path) as file:
         try:
             return json.load(file)
         except json.JSONDecodeError:
             return False
 
 
-content = {}
+def write_level(content: dict) -> None:
+    global level, palette
+
+    level = content
+    palette = [None, *content["blocks"]]
+    with open(LEVEL_FILE, "w") as file:
+        json.dump(content, file)
+
+
 def init():
-    global content
-    
-    if not settings.AVOID_SAVE:
-        create_file()
-        content = read_content()
-        if not content:
-            remove_save()
-            create_file()
-            content = read_content()
+    if settings.AVOID_SAVE:
+        return
+
+    if os.path.exists(LEGACY_SAVE_FILE):
+        convert_json_save()
+
+    create_save()
+    content = read_json(LEVEL_FILE)
+    if not content:
+        remove_save()
+        create_save()
+        content = read_json(LEVEL_FILE)
+
+    write_level(content)
+
+
+def convert_json_save(path: str = LEGACY_SAVE_FILE) -> None:
+    """
+    One-time conversion of the JSON save (used by older versions) into region
+    files. Converted file is kept with `.old` suffix.
+    """
+    content = read_json(path)
+    if content:
+        close_regions()
+        if os.path.exists(SAVE_DIR):
+            shutil.rmtree(SAVE_DIR)
+        os.makedirs(SAVE_DIR)
+        write_level({"seed": content["seed"], "blocks": list(blocks.BLOCK_IDS)})
+
+        for chunk_pos, chunk_diff in content["chunks"].items():
+            x, y = map(int, chunk_pos.split("."))
+            diff = {}
+            for raw_pos, voxel_name in chunk_diff.items():
+                pos = position.Coordinate.from_str(raw_pos)
+                if is_pos_saveable(pos):
+                    diff[pack_pos(*pos)] = get_palette_id(voxel_name)
+
+            if diff:
+                with lock:
+                    diffs[(x, y)] = diff
+                    write_chunk(x, y)
+
+    os.replace(path, path + ".old")
+
+
+def is_pos_saveable(pos: position.Coordinate) -> bool:
+    return (
+        0 <= pos.x < settings.CHUNK_SIZE
+        and 0 <= pos.y < settings.CHUNK_SIZE
+        and 0 <= pos.z < settings.CHUNK_MAX_HEIGHT
+    )
+
+
+def get_palette_id(name: str | None) -> int:
+    """
+    Save's block ID of block type name (unknown names are treated as None). Types
+    missing in the palette (added after the save was created) are appended to it.
+    """
+    if name is not None and name not in blocks.BLOCK_IDS:
+        name = None
+    if name not in palette:
+        write_level({**level, "blocks": [*level["blocks"], name]})
+    return palette.index(name)
+
+
+def get_region(x: int, y: int) -> tuple[RegionFile, int]:
+    """Returns region of chunk (X, Y) and chunk's index in the offset table."""
+    region_key = (x // REGION_SIZE, y // REGION_SIZE)
+    if region_key not in regions:
+        path = SAVE_DIR + f"r.{region_key[0]}.{region_key[1]}.bin"
+        regions[region_key] = RegionFile(path)
+
+    index = (y % REGION_SIZE) * REGION_SIZE + x % REGION_SIZE
+    return regions[region_key], index
+
+
+def read_chunk(x: int, y: int) -> dict[int, int]:
+    """Chunk's difference (block ID at packed position) from cache or region."""
+    if (x, y) not in diffs:
+        region, index = get_region(x, y)
+        record = np.frombuffer(region.read_record(index), dtype=RECORD_DTYPE)
+        diffs[(x, y)] = dict(zip(record["pos"].tolist(), record["id"].tolist()))
+    return diffs[(x, y)]
+
+
+def write_chunk(x: int, y: int) -> None:
+    """Writes cached chunk's difference into it's region's record."""
+    diff = diffs[(x, y)]
+    record = np.empty(len(diff), dtype=RECORD_DTYPE)
+    record["pos"] = list(diff)
+    record["id"] = list(diff.values())
+
+    region, index = get_region(x, y)
+    region.write_record(index, record.tobytes())
 
 
 def update(chunk, pos: position.Coordinate, voxel) -> None:
     """Updates saved world's state at provided chunk:pos"""
-    if settings.AVOID_SAVE:
+    if settings.AVOID_SAVE or not is_pos_saveable(pos):
         return
-    
-    chunk_pos = f"{chunk.x}.{chunk.y}"
-    if not chunk_pos in content.get("chunks"):
-        content["chunks"][chunk_pos] = {}
 
-    pos = f"{pos.x}.{pos.y}.{pos.z}"
     if voxel is not None:
         voxel = voxel.name
-    content["chunks"][chunk_pos].update({pos: voxel})
 
-    with open(SAVE_FILE, "w") as file:
-        json.dump(content, file)
+    with lock:
+        read_chunk(chunk.x, chunk.y)[pack_pos(*pos)] = get_palette_id(voxel)
+        write_chunk(chunk.x, chunk.y)
 
 
 def get(chunk, pos) -> str | None | bool:
     """Returns voxel's name/None object if this position is saved or False if isn't."""
-    if settings.AVOID_SAVE:
-        return False
-    
-    chunk_pos = f"{chunk.x}.{chunk.y}"
-    pos = f"{pos.x}.{pos.y}.{pos.z}"
-    if chunk_pos not in content.get("chunks"):
+    if settings.AVOID_SAVE or not is_pos_saveable(pos):
         return False
 
-    return content["chunks"][chunk_pos].get(pos, False)
+    with lock:
+        diff = read_chunk(chunk.x, chunk.y)
+        if pack_pos(*pos) not in diff:
+            return False
+        return palette[diff[pack_pos(*pos)]]
 
 
 def has_chunk(x: int, y: int) -> bool:
-    """Check if save file has chunk data saved."""
+    """Check if save has chunk data saved."""
     if settings.AVOID_SAVE:
         return False
-    
-    chunk_pos = f"{x}.{y}"
-    return chunk_pos in content.get("chunks")
+
+    with lock:
+        if (x, y) in diffs:
+            return bool(diffs[(x, y)])
+        region, index = get_region(x, y)
+        return region.has_record(index)
 
 
 def get_chunk(x: int, y: int) -> dict:
-    """Returns raw content of saved chunk's data."""
+    """Returns saved chunk's data (voxel name/None at `X.Y.Z` position)."""
     if settings.AVOID_SAVE:
         return {}
-    
-    chunk_pos = f"{x}.{y}"
-    if has_chunk(x, y):
-        return content["chunks"][chunk_pos]
+
+    with lock:
+        return {
+            unpack_pos(packed).as_str(): palette[block_id]
+            for packed, block_id in read_chunk(x, y).items()
+        }
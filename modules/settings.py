@@ -1,8 +1,21 @@
+import os
+
+
 SCREEN_WIDTH = 1200
 SCREEN_HEIGHT = 900
 
 CHUNK_MAX_HEIGHT = 20
 CHUNK_SIZE = 16
 SEED = 12
+CHUNK_LOADING_WORKERS = 2
+# Only a few chunks are generated at once and every (spawned) process imports
+# pygame and numpy again, so more processes only cost startup time and memory.
+CHUNK_LOADING_PROCESSES = min(4, max(1, (os.cpu_count() or 1) - 1))
+MAX_LOADED_CHUNKS = 128
+PREFETCH_DISTANCE = 4
+PREFETCH_HEADING_MOVES = 6
+TRAVEL_DISTANCE = 4
+PATH_REPAIR_EXPANSIONS = 150
 
 AVOID_SAVE = False
+DIRTY_RECT_UPDATES = True
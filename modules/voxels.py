@@ -1,5 +1,6 @@
 from modules import particles
 from modules import position
+from modules import blocks
 from modules import calc
 
 import pygame
@@ -10,145 +11,196 @@ TEXTURES_PATH = "./res/texture/"
 
 
 DIRT_TEXTURES = []
-for i in range(10):
+for i in range(blocks.VARIANTS_COUNTS["dirt"]):
     DIRT_TEXTURES.append(
         pygame.image.load(TEXTURES_PATH + f"dirt/{i}.png").convert_alpha()
     )
 
 FLOWERS_TEXTURES = []
-for i in range(7):
+for i in range(blocks.VARIANTS_COUNTS["flower"]):
     FLOWERS_TEXTURES.append(
         pygame.image.load(TEXTURES_PATH + f"flowers/{i}.png").convert_alpha()
     )
 
 GRASS_TEXTURES = []
-for i in range(10):
+for i in range(blocks.VARIANTS_COUNTS["grass"]):
     GRASS_TEXTURES.append(
         pygame.image.load(TEXTURES_PATH + f"grass/{i}.png").convert_alpha()
     )
 
 ROCKS_TEXTURES = []
-for i in range(5):
+for i in range(blocks.VARIANTS_COUNTS["rock"]):
     ROCKS_TEXTURES.append(
         pygame.image.load(TEXTURES_PATH + f"rocks/{i}.png").convert_alpha()
     )
 
 WOOD_TEXTURES = []
-for i in range(5):
+for i in range(blocks.VARIANTS_COUNTS["wood"]):
     WOOD_TEXTURES.append(
         pygame.image.load(TEXTURES_PATH + f"wood/{i}.png").convert_alpha()
     )
 
 STONE_TEXTURES = []
-for i in range(2):
+for i in range(blocks.VARIANTS_COUNTS["stone"]):
     STONE_TEXTURES.append(
         pygame.image.load(TEXTURES_PATH + f"stone/{i}.png").convert_alpha()
     )
 
 WATER_TEXTURES = {
-    "full": pygame.image.load(TEXTURES_PATH + "water/full.png").convert_alpha(),
-    "e": pygame.image.load(TEXTURES_PATH + "water/e.png").convert_alpha(),
-    "n": pygame.image.load(TEXTURES_PATH + "water/n.png").convert_alpha(),
-    "ne": pygame.image.load(TEXTURES_PATH + "water/ne.png").convert_alpha(),
-    "nsew": pygame.image.load(TEXTURES_PATH + "water/nsew.png").convert_alpha(),
-    "nw": pygame.image.load(TEXTURES_PATH + "water/nw.png").convert_alpha(),
-    "s": pygame.image.load(TEXTURES_PATH + "water/s.png").convert_alpha(),
-    "se": pygame.image.load(TEXTURES_PATH + "water/se.png").convert_alpha(),
-    "sw": pygame.image.load(TEXTURES_PATH + "water/sw.png").convert_alpha(),
-    "w": pygame.image.load(TEXTURES_PATH + "water/w.png").convert_alpha(),
+    name: pygame.image.load(TEXTURES_PATH + f"water/{name}.png").convert_alpha()
+    for name in blocks.WATER_SHORES
 }
 
 
+DESK_TEXTURES = [pygame.image.load(TEXTURES_PATH + "desk.png").convert_alpha()]
+
+WATER_VARIANTS = blocks.WATER_VARIANTS
+EMPTY_ID = blocks.EMPTY_ID
+
+
 class Voxel:
-    def __init__(
-        self, name: str, coordinate: position.Coordinate, texture: pygame.Surface
-    ):
+    """
+    Voxel type. Every type has a single shared instance (flyweight), chunks
+    only store it's block ID and a texture variant index for each cell.
+    """
+
+    def __init__(self, name: str, textures: list[pygame.Surface]):
         self.name = name
-        self.coordinate = coordinate
-        self.texture = texture
-        self.render_x, self.render_y = calc.calc_tile_pos(
-            self.coordinate.x, self.coordinate.y, self.coordinate.z
-        )
-        self.rect = self.texture.get_rect().move(self.render_x, self.render_y)
-        self.individual_value = None
+        self.textures = textures
+        self.id = EMPTY_ID
+
+    def pick_variant(self, rng: random.Random | None = None) -> int:
+        """
+        Texture variant index for newly placed voxel of this type. Drawn from
+        rng (global random if not given).
+        """
+        return blocks.pick_variant(self.name, rng)
 
     def on_stand(self, position, player) -> None:
         return
 
     @staticmethod
-    def from_name(name: str, coords: position.Coordinate) -> "Voxel":
+    def from_name(name: str | None) -> "Voxel | None":
         if name is None:
             return None
-
-        translation = {
-            "desk": V_Desk,
-            "grass": V_Grass,
-            "dirt": V_Dirt,
-            "flower": V_Flower,
-            "rock": V_Rocks,
-            "stone": V_Stone,
-            "wood": V_Wood,
-            "water": V_Water,
-        }
-
-        return translation.get(name)(coords)
+        return VOXELS_BY_NAME.get(name)
 
 
 class V_Desk(Voxel):
-    def __init__(self, coordinate: position.Coordinate):
-        super().__init__(
-            "desk",
-            coordinate,
-            pygame.image.load(TEXTURES_PATH + "desk.png").convert_alpha(),
-        )
+    def __init__(self):
+        super().__init__("desk", DESK_TEXTURES)
 
 
 class V_Grass(Voxel):
-    def __init__(self, coordinate: position.Coordinate):
-        super().__init__("grass", coordinate, random.choice(GRASS_TEXTURES))
+    def __init__(self):
+        super().__init__("grass", GRASS_TEXTURES)
 
 
 class V_Dirt(Voxel):
-    def __init__(self, coordinate: position.Coordinate):
-        super().__init__("dirt", coordinate, random.choice(DIRT_TEXTURES))
+    def __init__(self):
+        super().__init__("dirt", DIRT_TEXTURES)
 
 
 class V_Flower(Voxel):
-    def __init__(self, coordinate: position.Coordinate):
-        super().__init__("flower", coordinate, random.choice(FLOWERS_TEXTURES))
+    def __init__(self):
+        super().__init__("flower", FLOWERS_TEXTURES)
 
 
 class V_Rocks(Voxel):
-    def __init__(self, coordinate: position.Coordinate):
-        super().__init__("rock", coordinate, random.choice(ROCKS_TEXTURES))
+    def __init__(self):
+        super().__init__("rock", ROCKS_TEXTURES)
 
 
 class V_Stone(Voxel):
-    def __init__(self, coordinate: position.Coordinate):
-        super().__init__("stone", coordinate, random.choice(STONE_TEXTURES))
+    def __init__(self):
+        super().__init__("stone", STONE_TEXTURES)
 
 
 class V_Wood(Voxel):
-    def __init__(self, coordinate: position.Coordinate):
-        super().__init__("wood", coordinate, random.choice(WOOD_TEXTURES))
+    def __init__(self):
+        super().__init__("wood", WOOD_TEXTURES)
 
 
 class V_Water(Voxel):
-    def __init__(self, coordinate: position.Coordinate):
-        super().__init__(
-            "water", coordinate, WATER_TEXTURES.get("full").convert_alpha()
-        )
+    def __init__(self):
+        super().__init__("water", list(WATER_TEXTURES.values()))
 
     def on_stand(self, position, player) -> None:
         particles.create_water_particle(position)
 
 
-ENVIRONMENT_OBJECTS = [V_Flower, V_Rocks, V_Wood]
+class Block:
+    """Voxel placed at specific coordinate. Created on demand from chunk's grids."""
+
+    __slots__ = ("voxel", "coordinate", "variant")
+
+    def __init__(self, voxel: Voxel, coordinate: position.Coordinate, variant: int):
+        self.voxel = voxel
+        self.coordinate = coordinate
+        self.variant = variant
+
+    @property
+    def name(self) -> str:
+        return self.voxel.name
+
+    @property
+    def texture(self) -> pygame.Surface:
+        return self.voxel.textures[self.variant]
+
+    @property
+    def rect(self) -> pygame.Rect:
+        return get_rect(self.coordinate.x, self.coordinate.y, self.coordinate.z)
+
+
+def get_rect(x: int, y: int, z: int) -> pygame.Rect:
+    """Screen rect of voxel at (X, Y, Z). (All voxel textures share size)"""
+    return pygame.Rect(calc.calc_tile_pos(x, y, z), TEXTURE_SIZE)
+
+
+TEXTURE_SIZE = GRASS_TEXTURES[0].get_size()
+
+DESK = V_Desk()
+GRASS = V_Grass()
+DIRT = V_Dirt()
+FLOWER = V_Flower()
+ROCKS = V_Rocks()
+STONE = V_Stone()
+WOOD = V_Wood()
+WATER = V_Water()
+
+ALL_VOXELS = [DESK, DIRT, FLOWER, GRASS, ROCKS, STONE, WATER, WOOD]
+VOXELS_BY_NAME = {voxel.name: voxel for voxel in ALL_VOXELS}
+
+ENVIRONMENT_OBJECTS = [VOXELS_BY_NAME[name] for name in blocks.ENVIRONMENT_OBJECTS]
+
+
+def random_env_object(rng: random.Random | None = None) -> Voxel:
+    return VOXELS_BY_NAME[blocks.random_env_object(rng)]
+
+
+SKIP_ON_VISIBLITY_CHECK = (*ENVIRONMENT_OBJECTS, WATER)
+
+
+# Pre-generate highlight and ghost outlines of every texture variant.
+for voxel in ALL_VOXELS:
+    for texture in voxel.textures:
+        calc.get_outline(texture)
+        calc.get_outline(texture, calc.GHOST_OUTLINE_COLOR)
+
 
+# Block IDs registry used by chunk's storage.
+ID_VOXELS: list[Voxel | None] = [None]
+ID_VOXELS.extend(VOXELS_BY_NAME[name] for name in blocks.BLOCK_IDS)
+for block_id, voxel in enumerate(ID_VOXELS):
+    if voxel is not None:
+        voxel.id = block_id
 
-def random_env_object(coordinate: position.Coordinate) -> Voxel:
-    return random.choice(ENVIRONMENT_OBJECTS)(coordinate)
+WATER_ID = blocks.WATER_ID
+SKIP_ON_VISIBLITY_CHECK_IDS = frozenset(voxel.id for voxel in SKIP_ON_VISIBLITY_CHECK)
 
 
-SKIP_ON_VISIBLITY_CHECK = (*ENVIRONMENT_OBJECTS, V_Water)
-ALL_VOXELS = [V_Desk, V_Dirt, V_Flower, V_Grass, V_Rocks, V_Stone, V_Water, V_Wood]
+def get_id(voxel: Voxel | None) -> int:
+    """Returns block ID of voxel (EMPTY_ID for None)."""
+    if voxel is None:
+        return EMPTY_ID
+    return voxel.id
@@ -2,56 +2,623 @@ from modules import generation
 from modules import position
 from modules import settings
 from modules import voxels
+from modules import events
 from modules import saves
 from modules import calc
 
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
 from dataclasses import dataclass
+from typing import Callable, Iterable
+from collections import OrderedDict, deque
+import concurrent.futures
+import multiprocessing
+import numpy as np
+import itertools
+import threading
 import random
+import atexit
+import queue
+
+
+def ground_mask(column: int) -> int:
+    """Column's bits of Z levels that are solid and have 2 empty voxels above."""
+    return column & ~(column >> 1) & ~(column >> 2)
+
+
+# Chunk's shadow code bits: side and corner shadows cast by the blocks one
+# level higher and the distance (1-10) to the block above for the full shadow.
+SHADOW_LEFT = 1
+SHADOW_RIGHT = 2
+SHADOW_CORNER = 4
+SHADOW_FULL_SHIFT = 3
+SHADOW_FULL_RANGE = 10
 
 
 @dataclass
 class HighlightedItem:
-    block: voxels.Voxel
+    block: voxels.Block
     face: position.BlockFace
 
 
 class Chunk:
-    def __init__(self, x: int, y: int) -> None:
+    def __init__(
+        self,
+        x: int,
+        y: int,
+        grids: tuple[np.ndarray, np.ndarray] | None = None,
+        memory: shared_memory.SharedMemory | None = None,
+    ) -> None:
         self.x = x
         self.y = y
         self.size = settings.CHUNK_SIZE
 
-        self.voxels = generation.generate_chunk(self.x, self.y)
-        self.skip_heights = []
-        self.__calc_skip_heights()
+        # Block IDs and texture variants grids indexed as [z, y, x]. Generated
+        # if not given.
+        if grids is None:
+            grids = generation.generate_chunk(self.x, self.y)
+        self.blocks, self.variants = grids
+
+        # Amount of blocks in every Z layer.
+        self.layer_counts: list[int] = []
+        self.__calc_counters()
+
+        # Bitmask of visible blocks' X for every [z][y] row.
+        self.visible_rows: list[list[int]] = []
+        self.__calc_visibility()
+
+        # Per (X, Y) column data indexed as [y][x]: occupancy bitmask (bit Z is
+        # set if there is a block at Z) and the highest block's Z (-1 if none).
+        self.columns: list[list[int]] = []
+        self.heightmap: list[list[int]] = []
+        self.__calc_columns()
+
+        # Shadow code (SHADOW_* bits) cast on the top of every [z, y, x] cell.
+        self.shadows = np.zeros_like(self.blocks)
+        self.__calc_shadows(0, self.size, 0, self.size)
+
+        # Set after the first edit. (Edits not kept in save are lost if chunk
+        # is unloaded)
+        self.is_edited = False
+
+        # Shared memory block the grids are stored in (if generated by worker
+        # process). Assigned last, so it's released after the grids.
+        self.memory = memory
+
+    def __calc_shadows(self, x0: int, x1: int, y0: int, y1: int) -> None:
+        """Recalculates shadow codes of [x0, x1) x [y0, y1) columns."""
+        height = settings.CHUNK_MAX_HEIGHT
+
+        # Only the changed columns and the ones before them, padded with an empty
+        # top layer. Row and column at -1 (out of the chunk) stay empty.
+        solid = np.zeros((height + 1, y1 - y0 + 1, x1 - x0 + 1), dtype=bool)
+        from_y, from_x = max(y0 - 1, 0), max(x0 - 1, 0)
+        solid[:height, from_y - y0 + 1 :, from_x - x0 + 1 :] = (
+            self.blocks[:, from_y:y1, from_x:x1] != voxels.EMPTY_ID
+        )
 
-    def __calc_skip_heights(self) -> None:
-        skip = []
-        for z, z_row in enumerate(self.voxels):
-            if calc.is_all_none(z_row):
-                skip.append(z)
-                break
+        above = solid[1:, 1:, 1:]
+        left = solid[1:, 1:, :-1]
+        right = solid[1:, :-1, 1:]
+        corner = solid[1:, :-1, :-1]
+
+        # Distance to the nearest block above (0 if none or out of range): Z of
+        # the nearest solid `above` cell at or over every Z.
+        levels = np.arange(height).reshape(-1, 1, 1)
+        nearest = np.where(above, levels, height)
+        nearest = np.minimum.accumulate(nearest[::-1], axis=0)[::-1]
+        distance = (nearest - levels + 1).astype(np.uint8)
+        distance[(nearest == height) | (distance > SHADOW_FULL_RANGE)] = 0
+
+        shadows = (
+            left * SHADOW_LEFT
+            | right * SHADOW_RIGHT
+            | corner * SHADOW_CORNER
+            | distance << SHADOW_FULL_SHIFT
+        )
+        self.shadows[:, y0:y1, x0:x1] = np.where(above, 0, shadows)
+
+    def __calc_columns(self) -> None:
+        solid = (self.blocks != voxels.EMPTY_ID).astype(np.int64)
+        weights = np.left_shift(1, np.arange(settings.CHUNK_MAX_HEIGHT, dtype=np.int64))
+        self.columns = np.tensordot(weights, solid, axes=1).tolist()
+        self.heightmap = [
+            [calc.highest_bit(column) for column in row] for row in self.columns
+        ]
+
+    def __calc_counters(self) -> None:
+        self.layer_counts = np.count_nonzero(self.blocks, axis=(1, 2)).tolist()
+
+    def __update_counters(self, z: int, change: int) -> None:
+        self.layer_counts[z] += change
+
+    def __calc_visibility(self) -> None:
+        blocks = self.blocks
+        covering = (blocks != voxels.EMPTY_ID) & ~np.isin(
+            blocks, list(voxels.SKIP_ON_VISIBLITY_CHECK_IDS)
+        )
 
-        self.skip_heights = skip
+        # Block is hidden only if it's covered from the top, left and right.
+        hidden = np.zeros_like(covering)
+        hidden[:-1, :-1, :-1] = (
+            covering[1:, :-1, :-1] & covering[:-1, 1:, :-1] & covering[:-1, :-1, 1:]
+        )
+        visible = (blocks != voxels.EMPTY_ID) & ~hidden
+
+        weights = np.left_shift(1, np.arange(self.size, dtype=np.int64))
+        self.visible_rows = (visible.astype(np.int64) @ weights).tolist()
+
+    def __is_covering(self, x: int, y: int, z: int) -> bool:
+        """Check if block at (X, Y, Z) hides blocks behind it."""
+        if x >= self.size or y >= self.size or z >= settings.CHUNK_MAX_HEIGHT:
+            return False
+        block_id = self.get_id_at(x, y, z)
+        return (
+            block_id != voxels.EMPTY_ID
+            and block_id not in voxels.SKIP_ON_VISIBLITY_CHECK_IDS
+        )
+
+    def __update_visibility_at(self, x: int, y: int, z: int) -> None:
+        if x < 0 or y < 0 or z < 0:
+            return
+
+        visible = self.get_id_at(x, y, z) != voxels.EMPTY_ID and not (
+            self.__is_covering(x, y, z + 1)
+            and self.__is_covering(x, y + 1, z)
+            and self.__is_covering(x + 1, y, z)
+        )
+        if visible:
+            self.visible_rows[z][y] |= 1 << x
+        else:
+            self.visible_rows[z][y] &= ~(1 << x)
+
+    def update_visibility(self, coordinate: position.Coordinate) -> None:
+        """Updates visibility of block at coordinate and blocks it may cover."""
+        x, y, z = coordinate
+        self.__update_visibility_at(x, y, z)
+        self.__update_visibility_at(x, y, z - 1)
+        self.__update_visibility_at(x, y - 1, z)
+        self.__update_visibility_at(x - 1, y, z)
+
+    def is_visible(self, x: int, y: int, z: int) -> bool:
+        return bool(self.visible_rows[z][y] >> x & 1)
+
+    def is_layer_empty(self, z: int) -> bool:
+        return self.layer_counts[z] == 0
+
+    def get_id_at(self, x: int, y: int, z: int) -> int:
+        """Block ID at chunk's (X, Y, Z). Raises IndexError if out of range."""
+        return self.blocks.item(z, y, x)
+
+    def get_at(self, x: int, y: int, z: int) -> voxels.Block | None:
+        """Block at chunk's (X, Y, Z). Raises IndexError if out of range."""
+        voxel = voxels.ID_VOXELS[self.get_id_at(x, y, z)]
+        if voxel is None:
+            return None
+        return voxels.Block(
+            voxel, position.Coordinate(x, y, z), self.variants.item(z, y, x)
+        )
 
     def set_at(
-        self, coordinate: position.Coordinate, item: voxels.Voxel | None
+        self,
+        coordinate: position.Coordinate,
+        item: voxels.Voxel | None,
+        variant: int | None = None,
     ) -> bool:
         if coordinate.z > settings.CHUNK_MAX_HEIGHT - 1:
             return False
-        z_row = self.voxels[coordinate.z]
-        if coordinate.y > len(z_row) - 1:
+        if coordinate.y > self.size - 1:
             return False
-        y_row = z_row[coordinate.y]
-        if coordinate.x > len(y_row) - 1:
+        if coordinate.x > self.size - 1:
             return False
 
-        self.voxels[coordinate.z][coordinate.y][coordinate.x] = item
-        self.__calc_skip_heights()
+        x, y, z = coordinate
+        was_empty = self.get_id_at(x, y, z) == voxels.EMPTY_ID
+        self.blocks[z, y, x] = voxels.get_id(item)
+        if item is not None and variant is None:
+            variant = item.pick_variant()
+        self.variants[z, y, x] = variant or 0
+
+        if was_empty and item is not None:
+            self.__update_counters(z, 1)
+        if not was_empty and item is None:
+            self.__update_counters(z, -1)
+
+        column = self.columns[y][x]
+        if item is None:
+            column &= ~(1 << z)
+        else:
+            column |= 1 << z
+        self.columns[y][x] = column
+        self.heightmap[y][x] = calc.highest_bit(column)
+
+        # Block casts shadows on it's column and the right, left and corner ones.
+        self.__calc_shadows(x, min(x + 2, self.size), y, min(y + 2, self.size))
         return True
 
 
-class World:
+class ColumnQueries:
+    """
+    Queries over columns' occupancy bitmasks of `current_chunk` and loaded
+    `chunks` (objects with x, y and columns). Coordinates are relative to the
+    current chunk and out of it's range reach into loaded bounding chunks.
+    """
+
+    def chunk_key_at(self, x: int, y: int) -> tuple[int, int]:
+        """Key of chunk containing (X, Y) relative to current chunk."""
+        return (
+            self.current_chunk.x + x // settings.CHUNK_SIZE,
+            self.current_chunk.y - y // settings.CHUNK_SIZE,
+        )
+
+    def to_world(self, coordinate: position.Coordinate) -> position.Coordinate:
+        """Converts coordinate relative to current chunk into world coordinate."""
+        return coordinate.offset(
+            self.current_chunk.x * settings.CHUNK_SIZE,
+            -self.current_chunk.y * settings.CHUNK_SIZE,
+            0,
+        )
+
+    def to_relative(self, coordinate: position.Coordinate) -> position.Coordinate:
+        """Converts world coordinate into coordinate relative to current chunk."""
+        return coordinate.offset(
+            -self.current_chunk.x * settings.CHUNK_SIZE,
+            self.current_chunk.y * settings.CHUNK_SIZE,
+            0,
+        )
+
+    def is_loaded_at(self, x: int, y: int) -> bool:
+        """Check if chunk containing (X, Y) is loaded."""
+        return self.chunk_key_at(x, y) in self.chunks
+
+    def column_at(self, x: int, y: int) -> int:
+        """Occupancy bitmask of (X, Y) column. (0 if it's chunk is not loaded)"""
+        size = settings.CHUNK_SIZE
+        if 0 <= x < size and 0 <= y < size:
+            return self.current_chunk.columns[y][x]
+
+        chunk = self.chunks.get(self.chunk_key_at(x, y))
+        if chunk is None:
+            return 0
+        return chunk.columns[y % size][x % size]
+
+    def is_solid(self, x: int, y: int, z: int) -> bool:
+        """Check if there is any block at (X, Y, Z)."""
+        if z < 0:
+            return False
+        return bool(self.column_at(x, y) >> z & 1)
+
+    def is_ground(self, x: int, y: int, z: int) -> bool:
+        """Check if (X, Y, Z) is a block with 2 empty voxels above it."""
+        if z < 0:
+            return False
+        return bool(ground_mask(self.column_at(x, y)) >> z & 1)
+
+    def nearest_higher_at(self, x: int, y: int, start_z: int) -> int:
+        """Nearest higher Z index for (X, Y)."""
+        above = self.column_at(x, y) >> (start_z + 1)
+        if not above:
+            return 0
+        return start_z + 1 + calc.lowest_bit(above)
+
+    def nearest_higher_ground_at(self, x: int, y: int, start_z: int) -> int:
+        """Nearest higher Z index for (X, Y) that has None above."""
+        if start_z < 0:
+            return start_z
+        limit = (1 << (settings.CHUNK_MAX_HEIGHT - 1)) - 1
+        above = (ground_mask(self.column_at(x, y)) & limit) >> start_z
+        if not above:
+            return start_z
+        return start_z + calc.lowest_bit(above)
+
+    def nearest_lower_ground_at(self, x: int, y: int, start_z: int) -> int:
+        """Nearest lower Z index for (X, Y) that has None above."""
+        if start_z < 0:
+            return start_z
+        below = ground_mask(self.column_at(x, y)) & ((1 << (start_z + 1)) - 1)
+        if not below:
+            return start_z
+        return calc.highest_bit(below)
+
+    def reachable_grounds_at(self, x: int, y: int) -> list[position.Coordinate]:
+        """Find all reachable grounds at given (X, Y). (min 2 voxels of Z space.)"""
+        grounds = ground_mask(self.column_at(x, y))
+        grounds &= (1 << (settings.CHUNK_MAX_HEIGHT - 2)) - 1
+
+        reachable = []
+        while grounds:
+            z = calc.lowest_bit(grounds)
+            reachable.append(position.Coordinate(x, y, z))
+            grounds &= grounds - 1
+        return reachable
+
+    def nearest_lower_at(self, x: int, y: int, start_z: int) -> int:
+        """Nearest lower Z index for (X, Y)."""
+        if start_z <= 0:
+            return 0
+        below = self.column_at(x, y) & ((1 << start_z) - 1)
+        if not below:
+            return 0
+        return calc.highest_bit(below)
+
+
+class ChunkColumns:
+    """Copy of chunk's columns bitmasks."""
+
+    __slots__ = ("x", "y", "columns")
+
+    def __init__(self, chunk: Chunk) -> None:
+        self.x = chunk.x
+        self.y = chunk.y
+        self.columns = tuple(tuple(row) for row in chunk.columns)
+
+
+class WorldSnapshot(ColumnQueries):
+    """
+    Immutable copy of loaded chunks' columns. Column queries on it can be
+    safely made from other threads while the world is being edited.
+    """
+
+    def __init__(self, world: "World") -> None:
+        self.revision = world.revision
+        self.chunks = {key: ChunkColumns(chunk) for key, chunk in world.chunks.items()}
+        self.current_chunk = self.chunks[(world.current_chunk.x, world.current_chunk.y)]
+
+
+class ChunkLoader:
+    """
+    Generates chunks in a pool of background threads. Requested chunks are
+    generated in priority order (lower first) and delivered through the main
+    events loop, so they are adopted on the main thread only.
+
+    With worker processes, terrain is generated by a process pool into shared
+    memory blocks which are adopted by chunks without copying (threads only
+    wait for the processes), so generation scales with cores.
+    """
+
+    def __init__(
+        self,
+        on_loaded: Callable[[Chunk], None],
+        workers: int = settings.CHUNK_LOADING_WORKERS,
+        processes: int = settings.CHUNK_LOADING_PROCESSES,
+    ) -> None:
+        self.on_loaded = on_loaded
+        self.lock = threading.Lock()
+        self.__requests = queue.PriorityQueue()
+        self.__order = itertools.count()
+
+        # Requested chunks which are not delivered yet and priorities of the
+        # ones still waiting for generation.
+        self.pending: set[tuple[int, int]] = set()
+        self.__waiting: dict[tuple[int, int], int] = {}
+
+        # Shared memory blocks of chunks being generated by worker processes.
+        self.pool = None
+        self.processes = processes
+        self.is_closed = False
+        self.__is_pool_restarted = False
+        self.__building: set[shared_memory.SharedMemory] = set()
+        if processes > 0:
+            # Releases memory of interrupted builds. Threads can still see the pool
+            # shut down before it runs, so the game closes the loader itself.
+            atexit.register(self.close)
+            self.pool = self.__create_pool()
+            workers = max(workers, processes)
+
+        for _ in range(workers):
+            worker = threading.Thread(target=self.__worker, daemon=True)
+            worker.start()
+
+    def __create_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        return concurrent.futures.ProcessPoolExecutor(
+            self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=generation.init_worker,
+            initargs=(settings.SEED,),
+        )
+
+    def __replace_pool(self, broken: concurrent.futures.ProcessPoolExecutor) -> None:
+        """
+        Replaces process pool broken by a crashed process. If the new pool breaks
+        as well, chunks are generated by the loader threads.
+        """
+        with self.lock:
+            if self.pool is not broken or self.is_closed:
+                return
+
+            broken.shutdown(wait=False)
+            if self.__is_pool_restarted:
+                print("Chunk generation processes crashed again, using threads.")
+                self.pool = None
+            else:
+                print("Chunk generation process crashed, restarting processes.")
+                self.pool = self.__create_pool()
+                self.__is_pool_restarted = True
+
+    def close(self) -> None:
+        """Stops generation on exit. Chunks being generated are abandoned."""
+        self.is_closed = True
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        self.__release_building()
+
+    def request(self, key: tuple[int, int], priority: int) -> None:
+        """Queues chunk's generation. Already requested chunk can be prioritised."""
+        with self.lock:
+            if key in self.pending and self.__waiting.get(key, -1) <= priority:
+                return
+            self.pending.add(key)
+            self.__waiting[key] = priority
+        self.__requests.put((priority, next(self.__order), key))
+
+    def build(self, keys: Iterable[tuple[int, int]]) -> list[Chunk]:
+        """Generates chunks at given keys in parallel and waits for them."""
+        if self.pool is None:
+            return [Chunk(*key) for key in keys]
+
+        started = []
+        error = None
+        for key in keys:
+            try:
+                started.append(self.__start_build(key))
+            except Exception as start_error:
+                error = start_error
+                break
+
+        chunks = []
+        for build in started:
+            # Remaining builds are still finished to release their memory.
+            try:
+                chunks.append(self.__finish_build(*build))
+            except Exception as build_error:
+                error = error or build_error
+
+        if error is not None:
+            raise error
+        return chunks
+
+    def __start_build(self, key: tuple[int, int]) -> tuple:
+        memory = shared_memory.SharedMemory(
+            create=True, size=generation.SHARED_GRIDS_SIZE
+        )
+        with self.lock:
+            self.__building.add(memory)
+
+        try:
+            future = self.pool.submit(
+                generation.generate_shared_terrain, *key, memory.name
+            )
+        except BaseException:
+            with self.lock:
+                self.__building.discard(memory)
+            memory.close()
+            memory.unlink()
+            raise
+        return key, memory, future
+
+    def __finish_build(
+        self,
+        key: tuple[int, int],
+        memory: shared_memory.SharedMemory,
+        future: concurrent.futures.Future,
+    ) -> Chunk:
+        try:
+            future.result()
+        except BaseException:
+            memory.close()
+            raise
+        finally:
+            # Mapped memory stays valid, it's name is not needed anymore.
+            with self.lock:
+                self.__building.discard(memory)
+            memory.unlink()
+
+        grids = generation.shared_grids(memory)
+        generation.apply_saved_changes(*key, grids)
+        return Chunk(*key, grids, memory)
+
+    def __release_building(self) -> None:
+        """Unlinks shared memory of chunks which generation was interrupted."""
+        with self.lock:
+            for memory in self.__building:
+                memory.unlink()
+            self.__building.clear()
+
+    def __drop(self, key: tuple[int, int], error: Exception) -> None:
+        """Forgets failed request, so the chunk can be requested again."""
+        print(f"Failed to generate chunk {key}: {error!r}")
+        with self.lock:
+            self.pending.discard(key)
+
+    def __deliver(self, chunk: Chunk) -> None:
+        with self.lock:
+            self.pending.discard((chunk.x, chunk.y))
+        self.on_loaded(chunk)
+
+    def __worker(self) -> None:
+        while 1:
+            priority, _, key = self.__requests.get()
+            with self.lock:
+                # Outdated entry of reprioritised request.
+                if self.__waiting.get(key) != priority:
+                    continue
+                del self.__waiting[key]
+
+            pool = self.pool
+            try:
+                chunk = self.build([key])[0]
+            except Exception as error:
+                if self.is_closed:
+                    return
+                self.__drop(key, error)
+                if isinstance(error, BrokenProcessPool):
+                    self.__replace_pool(pool)
+                continue
+
+            deliver_ev = events.CallEvent(to_call=self.__deliver, args=[chunk])
+            events.main_loop.add_event(deliver_ev)
+
+
+class ChunkPrefetcher:
+    """
+    Requests generation of chunks the player is heading to before the border
+    is crossed. Heading is taken from the recent moves, chunks ahead of the
+    player are prioritised and the ones behind deprioritised.
+    """
+
+    def __init__(self, world: "World") -> None:
+        self.world = world
+        self.__moves: deque[tuple[int, int]] = deque(
+            maxlen=settings.PREFETCH_HEADING_MOVES
+        )
+
+    def get_heading(self) -> tuple[int, int]:
+        """Direction of recent moves as signs of (X, Y) offsets."""
+        heading_x = sum(offset_x for offset_x, _ in self.__moves)
+        heading_y = sum(offset_y for _, offset_y in self.__moves)
+        return (heading_x > 0) - (heading_x < 0), (heading_y > 0) - (heading_y < 0)
+
+    def get_priority(self, key: tuple[int, int]) -> int:
+        """
+        Generation priority of chunk by it's direction from the current chunk:
+        1 ahead, 2 aside (or no heading) and 3 behind.
+        """
+        heading_x, heading_y = self.get_heading()
+        offset_x = key[0] - self.world.current_chunk.x
+        offset_y = key[1] - self.world.current_chunk.y
+
+        # Chunk keys' Y grows in the opposite direction than coordinates' Y.
+        alignment = offset_x * heading_x - offset_y * heading_y
+        if alignment > 0:
+            return 1
+        if alignment < 0:
+            return 3
+        return 2
+
+    def on_move(
+        self, pos: position.Coordinate, direction: position.AngleDirection
+    ) -> None:
+        """
+        Records player's move to pos (relative to current chunk). If the player
+        is heading to a border close enough, chunks around the chunk behind it
+        are requested.
+        """
+        self.__moves.append(position.CROSS_OFFSETS[direction])
+        heading_x, heading_y = self.get_heading()
+
+        distance = settings.PREFETCH_DISTANCE
+        key = self.world.chunk_key_at(
+            pos.x + heading_x * distance, pos.y + heading_y * distance
+        )
+        if key == (self.world.current_chunk.x, self.world.current_chunk.y):
+            return
+
+        for bounding_key in (key, *calc.get_bounding_chunks_pos(*key)):
+            if bounding_key not in self.world.chunks:
+                self.world.loader.request(bounding_key, self.get_priority(bounding_key))
+
+
+class World(ColumnQueries):
     def __init__(self, seed: int = 10) -> None:
         self.seed = seed
         random.seed(seed)
@@ -59,18 +626,94 @@ class World:
         self.chunks: dict[tuple[int, int] : Chunk] = {(0, 0): Chunk(0, 0)}
         self.current_chunk: Chunk = self.chunks.get((0, 0))
 
-        self.__load_bounding_chunks()
+        # Bounding chunks are generated in the background, current chunk is
+        # always loaded.
+        self.loader = ChunkLoader(self.__adopt_chunk)
+        self.prefetcher = ChunkPrefetcher(self)
+
+        # Called with (chunk, coordinate) after every set_at().
+        self.change_listeners: list[Callable[[Chunk, position.Coordinate], None]] = []
+
+        # Called with every newly loaded / unloaded chunk.
+        self.load_listeners: list[Callable[[Chunk], None]] = []
+        self.unload_listeners: list[Callable[[Chunk], None]] = []
+
+        # Keys of loaded chunks from the least recently used one.
+        self.__chunks_usage: OrderedDict[tuple[int, int], None] = OrderedDict()
+        self.__chunks_usage[(0, 0)] = None
+
+        # Incremented on every successful set_at().
+        self.revision = 0
+
+        # Last get_highlighted_block() result and it's (mouse, revision, chunk) key.
+        self.__highlight_key = None
+        self.__highlighted: HighlightedItem | None = None
+
+        self.__request_bounding_chunks()
+
+    @property
+    def is_ready(self) -> bool:
+        """Check if all bounding chunks of the current chunk are loaded."""
+        return all(
+            key in self.chunks
+            for key in calc.get_bounding_chunks_pos(
+                self.current_chunk.x, self.current_chunk.y
+            )
+        )
+
+    def __adopt_chunk(self, chunk: Chunk) -> None:
+        pos = (chunk.x, chunk.y)
+        if pos in self.chunks:
+            return
+
+        self.chunks[pos] = chunk
+        self.__chunks_usage[pos] = None
+        for listener in self.load_listeners:
+            listener(chunk)
+
+    def __unload_chunk(self, pos: tuple[int, int]) -> None:
+        chunk = self.chunks.pop(pos)
+        del self.__chunks_usage[pos]
+        for listener in self.unload_listeners:
+            listener(chunk)
+
+    def __evict_chunks(self) -> None:
+        """
+        Unloads the least recently used chunks over MAX_LOADED_CHUNKS. Current
+        chunk and it's bounding chunks are kept, as well as edited chunks if
+        edits are not saved. Unloaded chunks are generated again on demand
+        (with saved changes applied).
+        """
+        excess = len(self.chunks) - settings.MAX_LOADED_CHUNKS
+        if excess <= 0:
+            return
+
+        current_pos = (self.current_chunk.x, self.current_chunk.y)
+        kept = {current_pos, *calc.get_bounding_chunks_pos(*current_pos)}
+        for pos in list(self.__chunks_usage):
+            if excess <= 0:
+                break
+            if pos in kept or (settings.AVOID_SAVE and self.chunks[pos].is_edited):
+                continue
+            self.__unload_chunk(pos)
+            excess -= 1
 
     def __load_chunk(self, x: int, y: int) -> None:
-        pos = (x, y)
-        if pos not in self.chunks:
-            self.chunks[pos] = Chunk(x, y)
+        """Generates chunk synchronously."""
+        if (x, y) not in self.chunks:
+            self.__adopt_chunk(Chunk(x, y))
 
-    def __load_bounding_chunks(self) -> None:
-        for bounding_x, bounding_y in calc.get_bounding_chunks_pos(
+    def request_chunk(self, key: tuple[int, int], priority: int = 0) -> None:
+        """Generates chunk in the background (with the highest priority by default)."""
+        if key not in self.chunks:
+            self.loader.request(key, priority)
+
+    def __request_bounding_chunks(self) -> None:
+        for key in calc.get_bounding_chunks_pos(
             self.current_chunk.x, self.current_chunk.y
         ):
-            self.__load_chunk(bounding_x, bounding_y)
+            if key not in self.chunks:
+                self.loader.request(key, self.prefetcher.get_priority(key))
 
     def update_current_chunk(self, change_x: int, change_y: int) -> bool:
         new_x = self.current_chunk.x + change_x
@@ -81,18 +724,32 @@ class World:
             self.__load_chunk(new_x, new_y)
 
         self.current_chunk = self.chunks.get(pos)
-        self.__load_bounding_chunks()
+        for key in (pos, *calc.get_bounding_chunks_pos(new_x, new_y)):
+            if key in self.__chunks_usage:
+                self.__chunks_usage.move_to_end(key)
+
+        self.__request_bounding_chunks()
+        self.__evict_chunks()
         return True
 
-    def get_at(self, x: int, y: int, z: int) -> voxels.Voxel | None:
+    def get_at(self, x: int, y: int, z: int) -> voxels.Block | None:
         if x < 0 or y < 0 or z < 0:
             return None
         try:
-            return self.current_chunk.voxels[z][y][x]
+            return self.current_chunk.get_at(x, y, z)
         except IndexError:
             return None
 
-    def get_at_coord(self, coordinate: position.Coordinate) -> voxels.Voxel | None:
+    def get_id_at(self, x: int, y: int, z: int) -> int:
+        """Block ID at (X, Y, Z) in current chunk (EMPTY_ID if out of range)."""
+        if x < 0 or y < 0 or z < 0:
+            return voxels.EMPTY_ID
+        try:
+            return self.current_chunk.get_id_at(x, y, z)
+        except IndexError:
+            return voxels.EMPTY_ID
+
+    def get_at_coord(self, coordinate: position.Coordinate) -> voxels.Block | None:
         return self.get_at(coordinate.x, coordinate.y, coordinate.z)
 
     def is_coord_valid(self, coordinate: position.Coordinate) -> bool:
@@ -111,137 +768,92 @@ class World:
         """Puts item at given coordinate. Returns False is coord out of range."""
         saves.update(self.current_chunk, coordinate, item)
         status = self.current_chunk.set_at(coordinate, item)
+        if status:
+            self.current_chunk.update_visibility(coordinate)
         
         for coord in [coordinate, *calc.get_cross_bounding_pos(coordinate).values(), *calc.get_cross_bounding_pos(coordinate.add_z(-1)).values(), *calc.get_cross_bounding_pos(coordinate.add_z(1)).values()]:
-            if self.is_coord_valid(coord) and isinstance(self.get_at_coord(coord), voxels.V_Water):
+            if self.is_coord_valid(coord) and self.get_id_at(coord.x, coord.y, coord.z) == voxels.WATER_ID:
                 self.update_water_shore(coord)
-                
-        return status
-
-    def highest_at(self, x: int, y: int) -> int | None:
-        """Highest block's Z index for (X, Y). (Not counting None)"""
-        coord = position.Coordinate(x, y, settings.CHUNK_MAX_HEIGHT)
-        for i in range(settings.CHUNK_MAX_HEIGHT - 1):
-            coord = coord.add_z(-1)
-            if self.get_at_coord(coord) is not None:
-                return coord.z
-        return None
-
-    def nearest_higher_at(self, x: int, y: int, start_z: int) -> int:
-        """Nearest higher Z index for (X, Y)."""
-        coord = position.Coordinate(x, y, start_z)
-        for _ in range((settings.CHUNK_MAX_HEIGHT - 1) - start_z):
-            coord = coord.add_z(1)
-            if self.get_at_coord(coord) is not None:
-                return coord.z
-        return 0
 
-    def nearest_higher_ground_at(self, x: int, y: int, start_z: int) -> int:
-        """Nearest higher Z index for (X, Y) that has None above."""
-        z = start_z
-        while z < settings.CHUNK_MAX_HEIGHT - 1:
-            pos = position.Coordinate(x, y, z)
-            if (
-                self.get_at_coord(pos) is not None
-                and self.get_at_coord(pos.add_z(1)) is None
-                and self.get_at_coord(pos.add_z(2)) is None
-            ):
-                return z
-            z += 1
-
-        return start_z
+        if status:
+            self.current_chunk.is_edited = True
+            self.revision += 1
+            for listener in self.change_listeners:
+                listener(self.current_chunk, coordinate)
 
-    def nearest_lower_ground_at(self, x: int, y: int, start_z: int) -> int:
-        """Nearest lower Z index for (X, Y) that has None above."""
-        z = start_z
-        while z >= 0:
-            pos = position.Coordinate(x, y, z)
-            if (
-                self.get_at_coord(pos) is not None
-                and self.get_at_coord(pos.add_z(1)) is None
-                and self.get_at_coord(pos.add_z(2)) is None
-            ):
-                return z
-            z -= 1
-
-        return start_z
+        return status
 
-    def reachable_grounds_at(self, x: int, y: int) -> list[position.Coordinate]:
-        """Find all reachable grounds at given (X, Y). (min 2 voxels of Z space.)"""
-        reachable = []
-        coord = position.Coordinate(x, y, 0)
-        while coord.z < settings.CHUNK_MAX_HEIGHT - 2:
-            if (
-                self.get_at_coord(coord) is not None
-                and self.get_at_coord(coord.add_z(1)) is None
-                and self.get_at_coord(coord.add_z(2)) is None
-            ):
-                reachable.append(coord)
-            coord = coord.add_z(1)
-        return reachable
+    def snapshot(self) -> WorldSnapshot:
+        return WorldSnapshot(self)
 
-    def nearest_lower_at(self, x: int, y: int, start_z: int) -> int:
-        """Nearest lower Z index for (X, Y)."""
-        coord = position.Coordinate(x, y, start_z)
-        for _ in range(start_z, -1, -1):
-            coord = coord.add_z(-1)
-            if self.get_at_coord(coord) is not None:
-                return coord.z
-        return 0
+    def highest_at(self, x: int, y: int) -> int | None:
+        """Highest block's Z index for (X, Y). (Not counting None)"""
+        if x < 0 or y < 0 or x >= settings.CHUNK_SIZE or y >= settings.CHUNK_SIZE:
+            highest = calc.highest_bit(self.column_at(x, y))
+        else:
+            highest = self.current_chunk.heightmap[y][x]
+        if highest < 1:
+            return None
+        return highest
 
     def get_highlighted_block(self, mx: int, my: int) -> HighlightedItem | None:
         """Returns nearest highlighted block according to mouse x and y pos."""
-        highlighted_block = None
-
-        for z, z_row in enumerate(self.current_chunk.voxels):
-            if z in self.current_chunk.skip_heights:
-                continue
-
-            for row in z_row:
-                if calc.is_all_none(row):
-                    continue
-
-                for block in row:
-                    if block and calc.is_in_real_rect(mx, my, block.rect):
-                        highlighted_block = block
-
-        if highlighted_block is None:
-            return None
-
-        face = calc.calc_block_face(mx, my, highlighted_block.rect)
-        return HighlightedItem(block=highlighted_block, face=face)
+        chunk = self.current_chunk
+        cache_key = (mx, my, self.revision, chunk)
+        if cache_key == self.__highlight_key:
+            return self.__highlighted
+
+        # Only a few tiles of every Z level are under the cursor. From the ones
+        # that are hit the block drawn last (highest Z, Y, X) wins.
+        candidates = [
+            (z, y, x)
+            for z in range(settings.CHUNK_MAX_HEIGHT)
+            if not chunk.is_layer_empty(z)
+            for x, y in calc.tiles_at_point(mx, my, z)
+            if 0 <= x < chunk.size
+            and 0 <= y < chunk.size
+            and chunk.get_id_at(x, y, z) != voxels.EMPTY_ID
+        ]
+
+        highlighted = None
+        if candidates:
+            origins = [calc.calc_tile_pos(x, y, z) for z, y, x in candidates]
+            faces = calc.calc_blocks_faces((mx, my), origins).tolist()
+            hits = [
+                (candidate, face)
+                for candidate, face in zip(candidates, faces)
+                if face != position.BlockFace.NONE
+            ]
+            if hits:
+                (z, y, x), face = max(hits)
+                highlighted = HighlightedItem(block=chunk.get_at(x, y, z), face=face)
+
+        self.__highlight_key = cache_key
+        self.__highlighted = highlighted
+        return highlighted
 
     def is_visible(self, coords: position.Coordinate) -> bool:
         """Check if item is surrounded by other blocks from: TOP, LEFT, RIGHT."""
-        top = self.get_at_coord(coords.add_z(1))
-        left = self.get_at_coord(coords.add_y(1))
-        right = self.get_at_coord(coords.add_x(1))
-
-        for surrounding_block in [top, left, right]:
-            if surrounding_block is None or isinstance(
-                surrounding_block, voxels.SKIP_ON_VISIBLITY_CHECK
-            ):
-                return True
-        return False
+        return self.current_chunk.is_visible(coords.x, coords.y, coords.z)
 
     def update_water_shore(self, coords: position.Coordinate) -> None:
         """Update water's texture according to it's bouding blocks."""
         bound_angles = []
+        blocks = self.current_chunk.blocks
 
         top_pos = coords.add_z(1)
-        if isinstance(self.current_chunk.voxels[top_pos.z][top_pos.y][top_pos.x], voxels.V_Water):
+        if blocks[top_pos.z, top_pos.y, top_pos.x] == voxels.WATER_ID:
             return
 
-        for angle, pos in calc.get_cross_bounding_pos(coords).items():
-            pos = pos.add_z(1)
+        for angle, pos in calc.get_cross_bounding_pos(top_pos).items():
             try:
-                if self.current_chunk.voxels[pos.z][pos.y][pos.x] is not None:
+                if blocks[pos.z, pos.y, pos.x] != voxels.EMPTY_ID:
                     bound_angles.append(angle)
             except IndexError:
                 pass
 
         angle_name = position.combine_angles_str(bound_angles)
-        new_texture = voxels.WATER_TEXTURES.get(angle_name)
-        if new_texture:
-            new_texture = new_texture.convert_alpha()
-            self.current_chunk.voxels[coords.z][coords.y][coords.x].texture = new_texture
\ No newline at end of file
+        if angle_name in voxels.WATER_VARIANTS:
+            self.current_chunk.variants[coords.z, coords.y, coords.x] = (
+                voxels.WATER_VARIANTS[angle_name]
+            )